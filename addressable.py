@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可寻址题目模块
+把一份虚拟的大题目集看作按题号排列的序列，第 i 道题只由 (种子, i) 决定，
+不依赖前面的题目，因此可以直接生成任意一页，而不必先生成前面的所有题目
+"""
+
+import hashlib
+from expression import ExpressionGenerator
+from question_index import operand_values
+
+
+# 每道题至少分到的候选数，保证几乎总能在候选中找到合法题目
+MIN_CANDIDATES = 128
+
+# 置换的 Feistel 轮数
+FEISTEL_ROUNDS = 4
+
+
+class KeyedPermutation:
+    """[0, size) 上由 key 决定的伪随机置换
+
+    平衡 Feistel 网络作用在不小于 size 的 2 的幂上，结果超出 size 时继续
+    置换（cycle walking），直到落回 [0, size)，因此仍是 [0, size) 上的一一映射。
+    """
+
+    def __init__(self, size, key):
+        self.size = size
+        bits = max((size - 1).bit_length(), 2)
+        bits += bits & 1
+        self._half = bits // 2
+        self._mask = (1 << self._half) - 1
+        self._width = (self._half + 7) // 8
+        self._keys = [hashlib.blake2b(f"{key}/{round_index}".encode('utf-8'),
+                                      digest_size=16).digest()
+                      for round_index in range(FEISTEL_ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def __call__(self, value):
+        if not 0 <= value < self.size:
+            raise IndexError("置换的输入超出范围")
+        half, mask, width = self._half, self._mask, self._width
+        while True:
+            left, right = value >> half, value & mask
+            for key in self._keys:
+                digest = hashlib.blake2b(right.to_bytes(width, 'little'), key=key,
+                                         digest_size=16).digest()
+                left, right = right, left ^ (int.from_bytes(digest, 'little') & mask)
+            value = (left << half) | right
+            if value < self.size:
+                return value
+
+
+class AddressableWorksheet:
+    """含 total 道不重复题目的虚拟题目集，第 i 道题可单独生成
+
+    数值范围较小时直接对穷举索引做置换：第 i 道题为索引中的第 P(i) 道。
+
+    否则按运算符个数把原始表达式空间（生成器的四种形状、运算符和操作数表的
+    全部组合）分为三类，各类题目数尽量相等（受该类空间大小限制）。某类分到
+    c 道题时，第 j 道题的候选为该类空间置换后的第 j、j + c、j + 2c ... 个
+    表达式，取其中第一个满足约束且为规范朝向的表达式。不同题目的候选互不相交，
+    规范朝向（可交换运算中能交换的两个子树按规范形式排好序）又使每个去重类
+    只有一个表达式入选，所以不同题号的题目一定不重复。
+
+    题目的分布与 ExpressionGenerator 不同：各类内部是原始表达式空间上的均匀分布。
+    """
+
+    def __init__(self, max_value, total, seed=0, use_index=None):
+        if total <= 0:
+            raise ValueError("题目总数必须为正整数")
+        self.max_value = max_value
+        self.total = total
+        self.seed = seed
+        # 求值规则、格式和去重键都取自生成器，保证与普通生成方式一致
+        self.generator = ExpressionGenerator(max_value=max_value, use_index=use_index)
+        self.operands = operand_values(max_value)
+
+        index = self.generator._get_index()
+        self._index = index
+        if index is not None:
+            if total > index.capacity:
+                raise ValueError(f"数值范围 {max_value} 内最多只能生成 "
+                                 f"{index.capacity} 道不重复的题目")
+            self._order = KeyedPermutation(index.capacity, f"{seed}/index")
+            return
+
+        n = len(self.operands)
+        ops = len(self.generator.operators)
+        # 运算符个数 -> 该类原始表达式的数量（三个运算符时有两种形状）
+        self._spaces = {1: ops * n ** 2, 2: ops ** 2 * n ** 3, 3: 2 * ops ** 3 * n ** 4}
+        capacities = [space // MIN_CANDIDATES for space in self._spaces.values()]
+        if total > sum(capacities):
+            raise ValueError(f"数值范围 {max_value} 内最多只能寻址 "
+                             f"{sum(capacities)} 道题目")
+        self._counts = dict(zip(self._spaces, _allocate(total, capacities)))
+        self._order = KeyedPermutation(total, f"{seed}/order")
+        self._permutations = {
+            operator_count: KeyedPermutation(space, f"{seed}/{operator_count}")
+            for operator_count, space in self._spaces.items()}
+
+    def __len__(self):
+        return self.total
+
+    def record(self, index):
+        """第 index 道题（从 0 开始），返回 (去重键, 题目, 答案)"""
+        if not 0 <= index < self.total:
+            raise IndexError("题号超出范围")
+        if self._index is not None:
+            return self._index.record(self._order(index))
+
+        # 先把题号打乱再分类，使每一页中的各类题目混在一起
+        position = self._order(index)
+        for operator_count, count in self._counts.items():
+            if position < count:
+                break
+            position -= count
+        return self._find(operator_count, position, count)
+
+    def iter_records(self, start, stop):
+        """依次产出第 start 到 stop - 1 道题的 (去重键, 题目, 答案)"""
+        for index in range(max(start, 0), min(stop, self.total)):
+            yield self.record(index)
+
+    def page(self, number, size):
+        """第 number 页（从 1 开始，每页 size 道题）的 (题号, 题目, 答案) 列表"""
+        if number <= 0 or size <= 0:
+            raise ValueError("页码和每页题目数必须为正整数")
+        start = (number - 1) * size
+        return [(index, exercise, answer) for index, (_, exercise, answer)
+                in enumerate(self.iter_records(start, start + size), start + 1)]
+
+    def _find(self, operator_count, position, count):
+        """在该类分给第 position 道题的候选中找到第一个合法的规范表达式"""
+        generator = self.generator
+        permutation = self._permutations[operator_count]
+        for candidate in range(position, self._spaces[operator_count], count):
+            tree = self._decode(operator_count, permutation(candidate))
+            if not self._is_oriented(tree):
+                continue
+            try:
+                result = generator._evaluate_expression_tree(tree)
+            except ValueError:
+                continue
+            return (generator._canonical_key(tree), generator._tree_to_string(tree),
+                    result.to_string())
+        raise RuntimeError(f"第 {operator_count} 类第 {position} 道题的候选中没有合法的题目")
+
+    def _decode(self, operator_count, rank):
+        """把原始表达式空间中的序号还原为表达式树，形状与生成器一致"""
+        operands = self.operands
+        operators = self.generator.operators
+        values = []
+        for _ in range(operator_count + 1):
+            rank, digit = divmod(rank, len(operands))
+            values.append(operands[digit])
+        ops = []
+        for _ in range(operator_count):
+            rank, digit = divmod(rank, len(operators))
+            ops.append(operators[digit])
+
+        tree = (ops[0], values[0], values[1])
+        if operator_count == 3 and rank == 1:
+            # (a∘b)∘(c∘d)
+            return (ops[1], tree, (ops[2], values[2], values[3]))
+        for op, value in zip(ops[1:], values[2:]):
+            tree = (op, tree, value)
+        return tree
+
+    def _is_oriented(self, tree):
+        """是否为所在去重类中唯一入选的朝向
+
+        只有两个子树同为操作数或同为子表达式时，交换后仍是空间中的表达式，
+        此时可交换运算的左子树的规范形式不能大于右子树。
+        """
+        generator = self.generator
+        if isinstance(tree, tuple):
+            op, left, right = tree
+            if not (self._is_oriented(left) and self._is_oriented(right)):
+                return False
+            if generator._is_commutative(op) and \
+                    isinstance(left, tuple) == isinstance(right, tuple):
+                return generator._canonical_form(left) <= generator._canonical_form(right)
+        return True
+
+
+def _allocate(total, capacities):
+    """把 total 道题尽量平均地分给各类，每类不超过其容量"""
+    counts = [0] * len(capacities)
+    remaining = total
+    order = sorted(range(len(capacities)), key=lambda k: capacities[k])
+    for position, k in enumerate(order):
+        counts[k] = min(capacities[k], remaining // (len(order) - position))
+        remaining -= counts[k]
+    return counts
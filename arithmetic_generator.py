@@ -6,10 +6,22 @@
 """
 
 import argparse
+import contextlib
+import os
+import random
 import sys
-from fraction import Fraction
+from fraction import Fraction, OperationCounter
 from expression import ExpressionGenerator
 from validator import Validator
+from batch_evaluator import DEFAULT_BATCH_SIZE
+from question_bank import QuestionBank
+from expression_pool import DEFAULT_POOL_SIZE
+from dedup import BloomKeySet, DEFAULT_ERROR_RATE
+import question_set
+
+
+# 分页模式下每页的默认题目数
+DEFAULT_PAGE_SIZE = 100
 
 
 def main():
@@ -19,46 +31,216 @@ def main():
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-n', type=int, help='生成题目的数量')
     group.add_argument('-e', type=str, help='题目文件路径')
+    group.add_argument('--worker', action='store_true',
+                       help='常驻模式：从标准输入逐行读取 JSON 任务，向标准输出逐行写出结果')
     
     parser.add_argument('-r', type=int, help='数值范围（自然数、真分数分母的范围）')
     parser.add_argument('-a', type=str, help='答案文件路径')
+    parser.add_argument('--constructive', action='store_true',
+                        help='构造式生成：按约束挑选操作数，减少被丢弃的尝试')
+    parser.add_argument('--batch', type=int, nargs='?', const=DEFAULT_BATCH_SIZE,
+                        metavar='SIZE',
+                        help=f'批量模式：按模板成批向量化求值（需要 numpy，默认每批 {DEFAULT_BATCH_SIZE}）')
+    parser.add_argument('--pool', type=int, nargs='?', const=DEFAULT_POOL_SIZE,
+                        metavar='SIZE',
+                        help=f'子表达式池：缓存相同子表达式的求值和格式化结果（默认最多 {DEFAULT_POOL_SIZE} 个节点）')
+    parser.add_argument('-j', type=int, default=1, help='并行生成或验证的工作进程数')
+    parser.add_argument('--stats', nargs='?', const='-', metavar='FILE',
+                        help='输出生成统计：不带文件名时打印报告，带文件名时写入 JSON')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式验证：按题号逐行对齐两个文件，成绩中的题号压缩为区间')
+    parser.add_argument('--submissions', nargs='+', metavar='PATH',
+                        help='批量批改：多份答案文件或包含答案文件的目录，题目只计算一次')
+    parser.add_argument('--grade-dir', default='grades', metavar='DIR',
+                        help='批量批改时成绩文件和错误率报告的输出目录（默认 grades）')
+    parser.add_argument('--append', action='store_true',
+                        help='追加模式：在已有的 Exercises.txt 和 Answers.txt 后追加题目，与已有题目不重复，题号接着编号')
+    parser.add_argument('--seed', type=int, help='随机种子（用于复现生成结果）')
+    parser.add_argument('--dedup', choices=('exact', 'bloom', 'verify'), default='exact',
+                        help='去重方式：exact 为内存中的精确集合（默认）；bloom 为内存固定的 '
+                             'Bloom 过滤器，偶尔丢弃不重复的题目；verify 在 bloom 基础上'
+                             '用磁盘上的有序文件精确核对')
+    parser.add_argument('--dedup-error-rate', type=float, default=DEFAULT_ERROR_RATE,
+                        metavar='RATE', help=f'Bloom 过滤器的误判率（默认 {DEFAULT_ERROR_RATE}）')
+    parser.add_argument('--dedup-memory', type=int, metavar='MB',
+                        help='Bloom 过滤器最多占用的内存（MB）')
+    parser.add_argument('--bank', metavar='PATH',
+                        help='题库文件：跨多次运行去重，新生成的题目会保存到题库')
+    parser.add_argument('--from-bank', action='store_true',
+                        help='不生成新题目，直接从题库中随机取出题目（需要 --bank）')
+    parser.add_argument('--operators', type=int, choices=(1, 2, 3),
+                        help='从题库取题时只取含指定运算符个数的题目')
+    parser.add_argument('--spec', metavar='FILE',
+                        help='配额模式：按 JSON 规格文件精确控制运算符个数、运算符、分数、括号和答案范围的比例')
+    parser.add_argument('--page', type=int, metavar='N',
+                        help='分页模式：把 -n 道题看作一份虚拟题目集，只生成其中第 N 页（与 --seed 一起决定题目）')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, metavar='SIZE',
+                        help=f'分页模式下每页的题目数（默认 {DEFAULT_PAGE_SIZE}）')
     
     args = parser.parse_args()
     
+    # 常驻工作进程模式
+    if args.worker:
+        from worker import Worker
+        Worker().run()
+    
+    # 从题库取题模式
+    elif args.from_bank:
+        if args.bank is None or args.n is None:
+            print("错误：从题库取题时必须使用 --bank 指定题库并用 -n 指定数量")
+            sys.exit(1)
+        
+        with QuestionBank(args.bank) as bank:
+            pairs = bank.fetch(args.n, max_value=args.r, operator_count=args.operators)
+        count = question_set.write_questions(((None, exercise, answer) for exercise, answer in pairs),
+                                             'Exercises.txt', 'Answers.txt', keys=False)
+        if count < args.n:
+            print(f"注意：题库中符合条件的题目只有 {count} 道")
+        print(f"已从题库取出 {count} 道题目，保存到 Exercises.txt 和 Answers.txt")
+    
+    # 分页模式：只生成虚拟题目集中的一页
+    elif args.page is not None:
+        if args.n is None or args.r is None:
+            print("错误：分页模式必须用 -n 指定题目集的总题数，并用 -r 指定数值范围")
+            sys.exit(1)
+        if args.n <= 0 or args.r <= 0 or args.page <= 0 or args.page_size <= 0:
+            print("错误：参数值必须为正整数")
+            sys.exit(1)
+        
+        from addressable import AddressableWorksheet
+        seed = 0 if args.seed is None else args.seed
+        try:
+            worksheet = AddressableWorksheet(args.r, args.n, seed=seed)
+        except ValueError as e:
+            print(f"错误：{e}")
+            sys.exit(1)
+        start = (args.page - 1) * args.page_size
+        records = list(worksheet.iter_records(start, start + args.page_size))
+        if not records:
+            print(f"错误：共 {args.n} 道题，每页 {args.page_size} 道，没有第 {args.page} 页")
+            sys.exit(1)
+        # 题号沿用整份题目集中的题号，并写入去重键索引，之后可以用 --append 接着追加
+        question_set.write_questions(records, 'Exercises.txt', 'Answers.txt', start=start + 1)
+        print(f"已生成第 {args.page} 页（第 {start + 1}-{start + len(records)} 题，种子 {seed}），"
+              f"保存到 Exercises.txt 和 Answers.txt")
+    
     # 生成题目模式
-    if args.n is not None:
+    elif args.n is not None:
         if args.r is None:
             print("错误：生成题目时必须使用 -r 参数指定数值范围")
             parser.print_help()
             sys.exit(1)
             
-        if args.n <= 0 or args.r <= 0:
+        if args.n <= 0 or args.r <= 0 or args.j <= 0 or (args.batch is not None and args.batch <= 0) \
+                or (args.pool is not None and args.pool <= 0) \
+                or (args.dedup_memory is not None and args.dedup_memory <= 0):
             print("错误：参数值必须为正整数")
             sys.exit(1)
             
-        generator = ExpressionGenerator(max_value=args.r)
-        exercises, answers = generator.generate_expressions(args.n)
+        collect_stats = args.stats is not None
+        if not 0 < args.dedup_error_rate < 1:
+            print("错误：误判率必须在 0 和 1 之间")
+            sys.exit(1)
+            
+        bank = QuestionBank(args.bank) if args.bank else None
+        dedup = None
+        if args.dedup != 'exact':
+            max_bytes = args.dedup_memory << 20 if args.dedup_memory else None
+            dedup = BloomKeySet(args.n, args.dedup_error_rate, max_bytes,
+                                verify=args.dedup == 'verify')
+        generator = ExpressionGenerator(max_value=args.r,
+                                        constructive=args.constructive,
+                                        batch_size=args.batch,
+                                        collect_stats=collect_stats,
+                                        bank=bank,
+                                        pool_size=args.pool,
+                                        dedup=dedup)
+        
+        # 追加模式：读取已有题目的去重键，新题目不与之重复
+        append = args.append and os.path.exists('Exercises.txt') and os.path.exists('Answers.txt')
+        if append:
+            generator.generated_expressions.update(question_set.load_keys('Exercises.txt', generator))
+            start = question_set.next_number('Exercises.txt')
         
-        # 保存题目和答案
-        with open('Exercises.txt', 'w', encoding='utf-8') as f:
-            for i, exercise in enumerate(exercises, 1):
-                f.write(f"{i}. {exercise} = \n")
+        # 数值范围很小时不重复的题目有限，扣除已有的题目和题库中的题目后数量不足时立即报错
+        capacity = generator.remaining_capacity()
+        if capacity is not None and args.n > capacity:
+            print(f"错误：数值范围 {args.r} 内最多只能再生成 {capacity} 道不重复的题目")
+            sys.exit(1)
+        if args.spec is not None:
+            if args.j > 1 or args.batch is not None or bank is not None:
+                print("错误：--spec 不能与 -j、--batch 或 --bank 同时使用")
+                sys.exit(1)
+            from quota import QuotaSpec, QuotaSampler
+            if args.seed is not None:
+                random.seed(args.seed)
+            # 先生成全部题目，规格无法满足时不改动已有的文件
+            try:
+                records = list(QuotaSampler(generator, QuotaSpec.load(args.spec)).iter_records(args.n))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"错误：{e}")
+                sys.exit(1)
+        elif args.j > 1:
+            records = generator.iter_records_parallel(args.n, args.j, seed=args.seed)
+        else:
+            if args.seed is not None:
+                random.seed(args.seed)
+            records = generator.iter_records(args.n)
+        
+        # 边生成边保存题目、答案和去重键索引
+        counter = OperationCounter() if collect_stats else contextlib.nullcontext()
+        with counter:
+            if append:
+                question_set.append_questions(records, 'Exercises.txt', 'Answers.txt')
+            else:
+                question_set.write_questions(records, 'Exercises.txt', 'Answers.txt')
+        if bank is not None:
+            bank.close()
+        if dedup is not None:
+            dedup.close()
         
-        with open('Answers.txt', 'w', encoding='utf-8') as f:
-            for i, answer in enumerate(answers, 1):
-                f.write(f"{i}. {answer}\n")
+        if append:
+            print(f"成功追加 {args.n} 道题目（第 {start}-{start + args.n - 1} 题），"
+                  f"已保存到 Exercises.txt 和 Answers.txt")
+        else:
+            print(f"成功生成 {args.n} 道题目，已保存到 Exercises.txt 和 Answers.txt")
+        print(f"共尝试 {generator.attempts} 次，约束拒绝率 {generator.rejection_rate():.1%}")
         
-        print(f"成功生成 {args.n} 道题目，已保存到 Exercises.txt 和 Answers.txt")
+        if collect_stats:
+            generator.stats.add_fraction_operations(counter.counts)
+            if args.stats == '-':
+                print(generator.stats.format_report())
+            else:
+                with open(args.stats, 'w', encoding='utf-8') as f:
+                    f.write(generator.stats.to_json() + '\n')
+                print(f"生成统计已保存到 {args.stats}")
     
     # 验证答案模式
     elif args.e is not None:
-        if args.a is None:
+        if args.a is None and args.submissions is None:
             print("错误：验证答案时必须使用 -a 参数指定答案文件")
             parser.print_help()
             sys.exit(1)
             
+        if args.j <= 0:
+            print("错误：参数值必须为正整数")
+            sys.exit(1)
+            
         validator = Validator()
-        validator.validate(args.e, args.a)
+        if args.submissions is not None:
+            try:
+                results = validator.validate_many(args.e, args.submissions, args.j, args.grade_dir)
+            except ValueError as e:
+                print(f"错误：{e}")
+                sys.exit(1)
+            print(f"已批改 {len(results)} 份答案，成绩和错误率报告已保存到 {args.grade_dir}")
+            return
+        if args.j > 1:
+            validator.validate_parallel(args.e, args.a, args.j)
+        elif args.stream:
+            validator.validate_stream(args.e, args.a)
+        else:
+            validator.validate(args.e, args.a)
         print("验证完成，结果已保存到 Grade.txt")
 
 
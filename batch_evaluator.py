@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量求值模块
+枚举生成器可能产生的表达式形状，把每种 (形状, 运算符) 模板编译为
+基于 FractionArray 的专用求值函数，一次计算一批操作数组合
+"""
+
+import itertools
+import random
+from fraction import FractionArray, np
+import generator_stats
+
+
+# 与 ExpressionGenerator._build_expression_tree 能产生的形状一一对应，
+# 叶子为操作数序号，内部节点为 (运算符序号, 左子树, 右子树)，并附带出现概率：
+# 两个运算符时总是从左到右；三个运算符时有 1/4 的概率为 (a ∘ b) ∘ (c ∘ d)
+SHAPES = {
+    1: [((0, 0, 1), 1.0)],
+    2: [((1, (0, 0, 1), 2), 1.0)],
+    3: [((2, (1, (0, 0, 1), 2), 3), 0.75),
+        ((1, (0, 0, 1), (2, 2, 3)), 0.25)],
+}
+
+# 一批中分数操作数的比例，与 Fraction.random_number 相同
+FRACTION_PROBABILITY = 0.3
+
+# 默认每批候选数量：模板有 148 种，批量足够大时每种模板才能分到足够多的候选
+DEFAULT_BATCH_SIZE = 65536
+
+
+class ExpressionTemplate:
+    """填入具体运算符的表达式形状，以及编译好的批量求值函数"""
+
+    __slots__ = ('skeleton', 'operand_count', 'weight', 'evaluate', 'instantiate')
+
+    def __init__(self, skeleton, operand_count, weight):
+        # skeleton 的叶子为操作数序号，内部节点为 (运算符, 左子树, 右子树)
+        self.skeleton = skeleton
+        self.operand_count = operand_count
+        self.weight = weight
+        self.evaluate = _compile(skeleton)
+        # 用具体的操作数替换叶子，得到表达式树
+        self.instantiate = _compile_instantiate(skeleton)
+
+
+def enumerate_templates(operators):
+    """枚举 1-3 个运算符的所有模板，权重为生成器随机选中该模板的概率"""
+    templates = []
+    for operator_count, shapes in SHAPES.items():
+        for shape, shape_weight in shapes:
+            for ops in itertools.product(operators, repeat=operator_count):
+                weight = shape_weight / len(SHAPES) / len(operators) ** operator_count
+                templates.append(ExpressionTemplate(_fill_operators(shape, ops),
+                                                    operator_count + 1, weight))
+    return templates
+
+
+def random_operand_arrays(rng, max_value, size):
+    """批量生成随机操作数（整数或真分数），取值范围与 Fraction.random_number 相同"""
+    is_fraction = rng.random(size) < FRACTION_PROBABILITY
+    if max_value < 2:
+        # 没有可用的分母，只能生成整数
+        is_fraction[:] = False
+
+    denominators = rng.integers(2, max(max_value, 2) + 1, size=size)
+    fraction_numerators = (rng.random(size) * (denominators - 1)).astype(np.int64) + 1
+    integers = rng.integers(0, max_value, size=size)
+
+    numerators = np.where(is_fraction, fraction_numerators, integers)
+    denominators = np.where(is_fraction, denominators, 1)
+    return FractionArray(numerators, denominators)
+
+
+def generate_batch(templates, max_value, size, rng=None):
+    """随机生成一批表达式并批量求值
+
+    返回满足约束的 (表达式树, 结果) 列表（按抽样顺序）以及
+    {拒绝原因: 数量}，每个被拒绝的候选只按最先违反的约束计一次。
+    """
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+
+    weights = np.array([template.weight for template in templates])
+    choices = rng.choice(len(templates), size=size, p=weights / weights.sum())
+
+    results = [None] * size
+    rejections = {}
+    for template_index in np.unique(choices):
+        positions = np.flatnonzero(choices == template_index)
+        template = templates[template_index]
+        operands = [random_operand_arrays(rng, max_value, len(positions))
+                    for _ in range(template.operand_count)]
+        values, valid = template.evaluate(operands, rejections)
+
+        # 只把满足约束的候选转换回 Fraction
+        columns = [column[valid].to_fractions() for column in operands]
+        for position, row, value in zip(positions[valid].tolist(), zip(*columns),
+                                        values[valid].to_fractions()):
+            results[position] = (template.instantiate(row), value)
+
+    return [result for result in results if result is not None], rejections
+
+
+def _fill_operators(shape, ops):
+    """把形状中的运算符序号替换为具体运算符"""
+    if isinstance(shape, int):
+        return shape
+    op_index, left, right = shape
+    return (ops[op_index], _fill_operators(left, ops), _fill_operators(right, ops))
+
+
+def _compile_instantiate(skeleton):
+    """把模板编译为构造函数：operands -> 表达式树"""
+    if isinstance(skeleton, int):
+        index = skeleton
+        return lambda operands: operands[index]
+
+    op, left, right = skeleton
+    if isinstance(left, int) and isinstance(right, int):
+        return lambda operands: (op, operands[left], operands[right])
+    build_left = _compile_instantiate(left)
+    build_right = _compile_instantiate(right)
+    return lambda operands: (op, build_left(operands), build_right(operands))
+
+
+def _compile(skeleton):
+    """把模板编译为求值函数：(operands, rejections) -> (结果数组, 有效掩码)
+
+    编译时就确定了每个节点的运算和约束检查，求值时不再遍历表达式树。
+    违反约束的位置在掩码中记为 False，其结果无意义；
+    rejections 字典按拒绝原因累计在该节点新出现的无效候选数。
+    """
+    if isinstance(skeleton, int):
+        index = skeleton
+
+        def leaf(operands, rejections):
+            values = operands[index]
+            return values, np.ones(len(values), dtype=bool)
+        return leaf
+
+    op, left, right = skeleton
+    evaluate_left = _compile(left)
+    evaluate_right = _compile(right)
+
+    if op == '+':
+        def node(operands, rejections):
+            left_val, left_ok = evaluate_left(operands, rejections)
+            right_val, right_ok = evaluate_right(operands, rejections)
+            return left_val + right_val, left_ok & right_ok
+    elif op == '-':
+        def node(operands, rejections):
+            left_val, left_ok = evaluate_left(operands, rejections)
+            right_val, right_ok = evaluate_right(operands, rejections)
+            # 减法结果不能为负数
+            ok = left_ok & right_ok
+            return left_val - right_val, _check(ok, left_val >= right_val, rejections,
+                                                generator_stats.NEGATIVE_SUBTRACTION)
+    elif op == '×':
+        def node(operands, rejections):
+            left_val, left_ok = evaluate_left(operands, rejections)
+            right_val, right_ok = evaluate_right(operands, rejections)
+            return left_val * right_val, left_ok & right_ok
+    else:
+        def node(operands, rejections):
+            left_val, left_ok = evaluate_left(operands, rejections)
+            right_val, right_ok = evaluate_right(operands, rejections)
+            # 除数不能为零：先把零除数替换为 1 再整体相除，随后用掩码剔除
+            nonzero = right_val.numerators != 0
+            divisor = FractionArray._from_reduced(
+                np.where(nonzero, right_val.numerators, 1),
+                np.where(nonzero, right_val.denominators, 1))
+            result = left_val / divisor
+            ok = _check(left_ok & right_ok, nonzero, rejections,
+                        generator_stats.ZERO_DIVISOR)
+            # 除法结果必须为真分数
+            return result, _check(ok, result.is_proper(), rejections,
+                                  generator_stats.IMPROPER_QUOTIENT)
+    return node
+
+
+def _check(ok, condition, rejections, reason):
+    """把约束条件并入有效掩码，并记录在此新出现的无效候选数"""
+    failed = int(np.count_nonzero(ok & ~condition))
+    if failed:
+        rejections[reason] = rejections.get(reason, 0) + failed
+    return ok & condition
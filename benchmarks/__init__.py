@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试包
+用固定随机种子测量题目生成、答案验证和分数运算的耗时、峰值内存和吞吐量，
+并与保存的基准结果比较以发现性能退化
+
+运行：python -m benchmarks [--quick] [--output 结果.json]
+"""
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试命令行入口
+"""
+
+import argparse
+import os
+import sys
+
+from benchmarks import suite
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='四则运算题目生成器性能基准测试')
+    parser.add_argument('--quick', action='store_true', help='只运行较小规模的用例')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的计时次数（取最快一次）')
+    parser.add_argument('--output', type=str, help='结果 JSON 文件路径')
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE, help='基准结果 JSON 文件路径')
+    parser.add_argument('--threshold', type=float, default=suite.DEFAULT_THRESHOLD,
+                        help='判定退化的比例')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基准')
+
+    args = parser.parse_args()
+
+    sizes = suite.QUICK_SIZES if args.quick else suite.SIZES
+    results = suite.run_suite(sizes=sizes, repeat=args.repeat)
+
+    if args.output:
+        suite.save(results, args.output)
+
+    if args.save_baseline:
+        suite.save(results, args.baseline)
+        print(f"基准结果已保存到 {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("未找到基准结果，跳过比较")
+        return
+
+    regressions = suite.compare(results, suite.load(args.baseline), args.threshold)
+    if regressions:
+        print("\n发现性能退化：")
+        for name, metric, base, current in regressions:
+            print(f"  {name} {metric}: {base:.4g} -> {current:.4g}")
+        sys.exit(1)
+    print("\n未发现性能退化")
+
+
+if __name__ == "__main__":
+    main()
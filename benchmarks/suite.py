@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试用例与计时工具
+"""
+
+import gc
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+from fraction import Fraction, LazyFraction
+from expression import ExpressionGenerator
+from validator import Validator
+import question_set
+
+
+# 题目数量与数值范围
+SIZES = [100, 1000, 10000]
+QUICK_SIZES = [100, 1000]
+RANGES = [10, 100]
+
+# 分数运算基准的运算次数
+FRACTION_OPERATIONS = 100000
+
+# 带分数运算链基准：链的条数与每条链的长度
+CHAIN_COUNT = 300
+CHAIN_LENGTH = 32
+
+# 固定随机种子，保证每次运行的工作量相同
+SEED = 20240101
+
+# 吞吐量下降或峰值内存增长超过该比例视为退化
+DEFAULT_THRESHOLD = 0.2
+
+# 每个用例至少累计计时的秒数与最多运行的次数：只需几毫秒的用例要多跑几次
+MIN_MEASURE_TIME = 0.5
+MAX_RUNS = 200
+
+# 校准循环的迭代次数（约 1-2ms），用于估计运行时机器的快慢
+CALIBRATION_LOOPS = 20000
+
+
+def measure(func, operations, repeat=3):
+    """测量一个基准用例
+
+    计时运行至少 repeat 次，且累计时间不少于 MIN_MEASURE_TIME（不超过 MAX_RUNS 次），
+    不开启 tracemalloc，避免干扰计时。wall_time 和 ops_per_sec 取最快的一次。
+
+    共享或降频的机器上，整段时间的速度可能相差一倍，单看耗时无法区分代码变慢和
+    机器变慢。因此每次运行前后各跑一次固定的校准循环，relative 为
+    (校准耗时 / 运行耗时) × operations 的中位数，即以校准循环为单位的吞吐量，
+    机器整体变快变慢时基本不变；noise 为 relative 的下四分位数比中位数低的比例，
+    比较时作为该用例的额外容差。
+
+    之后再单独运行一次用 tracemalloc 记录峰值内存。func 为 setup，每次运行前
+    调用它得到新的运行函数，准备工作不计时。
+    """
+    times = []
+    ratios = []
+    while len(times) < repeat or (sum(times) < MIN_MEASURE_TIME and len(times) < MAX_RUNS):
+        run = func()
+        gc.collect()
+        calibration = _calibrate()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        calibration = (calibration + _calibrate()) / 2
+        times.append(elapsed)
+        ratios.append(calibration / elapsed if elapsed > 0 else float('inf'))
+    best = min(times)
+    ratios.sort()
+    median = ratios[len(ratios) // 2]
+    lower = ratios[len(ratios) // 4]
+
+    run = func()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_time': best,
+        'peak_memory': peak,
+        'ops_per_sec': operations / best if best > 0 else float('inf'),
+        'relative': operations * median,
+        'noise': 1 - lower / median if median > 0 else 0.0,
+    }
+
+
+def _calibrate():
+    """运行固定的纯 Python 循环，返回耗时"""
+    start = time.perf_counter()
+    total = 0
+    for i in range(CALIBRATION_LOOPS):
+        total += i * i % 7
+    return time.perf_counter() - start
+
+
+def bench_generate(count, max_value):
+    """生成 count 道题目"""
+    def setup():
+        random.seed(SEED)
+        generator = ExpressionGenerator(max_value=max_value)
+        return lambda: generator.generate_expressions(count)
+    return setup
+
+
+def bench_validate(count, max_value, workdir):
+    """验证 count 道题目（题目和答案文件预先用固定种子生成）"""
+    random.seed(SEED)
+    exercises, answers = ExpressionGenerator(max_value=max_value).generate_expressions(count)
+    exercise_file = os.path.join(workdir, f'exercises_{count}_{max_value}.txt')
+    answer_file = os.path.join(workdir, f'answers_{count}_{max_value}.txt')
+    question_set.write_questions(((None, exercise, answer)
+                                  for exercise, answer in zip(exercises, answers)),
+                                 exercise_file, answer_file, keys=False)
+
+    def setup():
+        validator = Validator()
+        return lambda: validator.validate(exercise_file, answer_file)
+    return setup
+
+
+def bench_fraction_arithmetic(max_value):
+    """随机真分数之间的加减乘除与比较"""
+    def setup():
+        random.seed(SEED)
+        values = [Fraction.random_number(max_value) for _ in range(1000)]
+        pairs = [(values[i], values[(i * 7 + 1) % len(values)] + 1)
+                 for i in range(len(values))]
+
+        def run():
+            rounds = FRACTION_OPERATIONS // (len(pairs) * 5)
+            for _ in range(rounds):
+                for a, b in pairs:
+                    a + b
+                    a - b
+                    a * b
+                    a / b
+                    a < b
+        return run
+    return setup
+
+
+def bench_fraction_chain(max_value, fraction_class=Fraction):
+    """带分数按 + × - ÷ 轮流运算的长链，中间结果的分子分母逐步变大"""
+    def setup():
+        random.seed(SEED)
+        chains = []
+        for _ in range(CHAIN_COUNT):
+            chain = []
+            for _ in range(CHAIN_LENGTH):
+                denominator = random.randint(2, max(max_value, 2))
+                numerator = random.randint(1, denominator - 1) + random.randint(1, 5) * denominator
+                chain.append(fraction_class(numerator, denominator))
+            chains.append(chain)
+
+        def run():
+            for chain in chains:
+                value = chain[0]
+                for i, operand in enumerate(chain[1:]):
+                    step = i % 4
+                    if step == 0:
+                        value = value + operand
+                    elif step == 1:
+                        value = value * operand
+                    elif step == 2:
+                        value = value - operand
+                    else:
+                        value = value / operand
+                value.to_string()
+        return run
+    return setup
+
+
+def bench_fraction_parsing(max_value):
+    """从字符串解析整数、真分数和带分数"""
+    def setup():
+        random.seed(SEED)
+        texts = [(Fraction.random_number(max_value) + random.randint(0, 3)).to_string()
+                 for _ in range(1000)]
+
+        def run():
+            for _ in range(FRACTION_OPERATIONS // len(texts)):
+                for text in texts:
+                    Fraction.from_string(text)
+        return run
+    return setup
+
+
+def run_suite(sizes=SIZES, ranges=RANGES, repeat=3, log=print):
+    """运行全部基准用例，返回结果字典"""
+    results = {}
+    old_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # Validator 把 Grade.txt 写到当前目录
+        os.chdir(workdir)
+        try:
+            for max_value in ranges:
+                for count in sizes:
+                    cases = [
+                        (f'generate/n={count}/r={max_value}',
+                         bench_generate(count, max_value), count),
+                        (f'validate/n={count}/r={max_value}',
+                         bench_validate(count, max_value, workdir), count),
+                    ]
+                    for name, setup, operations in cases:
+                        results[name] = measure(setup, operations, repeat)
+                        log(_format_result(name, results[name]))
+
+                for name, setup in [
+                    (f'fraction/arithmetic/r={max_value}', bench_fraction_arithmetic(max_value)),
+                    (f'fraction/parse/r={max_value}', bench_fraction_parsing(max_value)),
+                ]:
+                    results[name] = measure(setup, FRACTION_OPERATIONS, repeat)
+                    log(_format_result(name, results[name]))
+                for name, setup in [
+                    (f'fraction/chain/r={max_value}', bench_fraction_chain(max_value)),
+                    (f'fraction/chain-lazy/r={max_value}',
+                     bench_fraction_chain(max_value, LazyFraction)),
+                ]:
+                    results[name] = measure(setup, CHAIN_COUNT * (CHAIN_LENGTH - 1), repeat)
+                    log(_format_result(name, results[name]))
+        finally:
+            os.chdir(old_cwd)
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': SEED,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """与基准结果比较，返回退化项列表 [(用例, 指标, 基准值, 当前值), ...]
+
+    吞吐量（两边都有 relative 时比较 relative，否则比较 ops_per_sec）下降超过
+    threshold 加上两次测量中较大的 noise，或峰值内存增长超过 threshold 视为退化，
+    只在基准中出现的用例被忽略。
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        metric = 'relative' if 'relative' in result and 'relative' in base else 'ops_per_sec'
+        tolerance = threshold + max(result.get('noise', 0.0), base.get('noise', 0.0))
+        if result[metric] < base[metric] * (1 - min(tolerance, 0.9)):
+            regressions.append((name, metric, base[metric], result[metric]))
+        if result['peak_memory'] > base['peak_memory'] * (1 + threshold):
+            regressions.append((name, 'peak_memory', base['peak_memory'], result['peak_memory']))
+    return regressions
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def _format_result(name, result):
+    return (f"{name:<32} {result['wall_time']:>9.4f}s "
+            f"{result['peak_memory'] / 1024 / 1024:>8.2f}MB "
+            f"{result['ops_per_sec']:>12.0f} ops/s "
+            f"(noise {result.get('noise', 0.0):.0%})")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+去重集合模块
+生成超大量题目时代替内存中的去重键集合：Bloom 过滤器的内存占用固定，
+可选地把去重键写入磁盘上的有序文件，对过滤器判为重复的键做精确核对
+"""
+
+import bisect
+import heapq
+import math
+import os
+import shutil
+import tempfile
+from expression import KEY_DIGEST_SIZE
+
+
+# 默认误判率：新题目被误判为重复而丢弃的概率
+DEFAULT_ERROR_RATE = 0.001
+
+# 精确核对时内存中缓存的去重键数，写满后排序写入磁盘
+DEFAULT_BUFFER_SIZE = 1 << 18
+
+# 磁盘上的有序文件超过该数量时合并为一个
+MAX_RUNS = 8
+
+
+class BloomFilter:
+    """以 ExpressionGenerator 的去重键（定长摘要）为元素的 Bloom 过滤器
+
+    按预计元素数 capacity 和误判率 error_rate 计算位数组大小，
+    max_bytes 限制位数组的字节数（超出时误判率随之升高）。
+    摘要本身已均匀分布，直接拆成两个 32 位整数做双重哈希。
+    """
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE, max_bytes=None):
+        bits = math.ceil(-max(capacity, 1) * math.log(error_rate) / math.log(2) ** 2)
+        if max_bytes is not None:
+            bits = min(bits, max_bytes * 8)
+        self.size = max(bits, 8)
+        self.hash_count = max(1, round(self.size / max(capacity, 1) * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return len(self._bits)
+
+    def __contains__(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def expected_error_rate(self):
+        """按已加入的元素数估算当前的误判率"""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+    def _positions(self, key):
+        value = int.from_bytes(key[:8], 'little')
+        first = value & 0xFFFFFFFF
+        step = (value >> 32) | 1
+        size = self.size
+        return [(first + i * step) % size for i in range(self.hash_count)]
+
+
+class BloomKeySet:
+    """可替代 generated_expressions 集合的去重键集合
+
+    只用 Bloom 过滤器时偶尔会把新题目误判为重复（概率约为 error_rate），
+    内存占用固定。verify 为 True 时，过滤器判为可能重复的键再与内存缓冲区
+    和磁盘上的有序文件精确核对，不会误判，内存中只保留缓冲区。
+    """
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE, max_bytes=None,
+                 verify=False, spill_dir=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.filter = BloomFilter(capacity, error_rate, max_bytes)
+        self.verify = verify
+        self.buffer_size = buffer_size
+        self._buffer = set()
+        self._runs = []
+        self._spill_dir = None
+        if verify:
+            self._spill_dir = tempfile.mkdtemp(prefix='dedup-', dir=spill_dir)
+
+    def __len__(self):
+        return len(self.filter)
+
+    def __contains__(self, key):
+        if key not in self.filter:
+            return False
+        if not self.verify:
+            return True
+        return key in self._buffer or any(_run_contains(run, key) for run in self._runs)
+
+    def add(self, key):
+        # 调用方总是先检查 key not in self，这里不再重复判断
+        self.filter.add(key)
+        if self.verify:
+            self._buffer.add(key)
+            if len(self._buffer) >= self.buffer_size:
+                self._spill()
+
+    def update(self, keys):
+        for key in keys:
+            if key not in self:
+                self.add(key)
+
+    def close(self):
+        """删除磁盘上的有序文件"""
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _spill(self):
+        """把缓冲区排序后写成一个有序文件，文件过多时合并"""
+        self._runs.append(_write_run(self._spill_dir, sorted(self._buffer)))
+        self._buffer = set()
+        if len(self._runs) > MAX_RUNS:
+            runs = self._runs
+            self._runs = [_write_run(self._spill_dir,
+                                     heapq.merge(*(_iter_run(run) for run in runs)))]
+            for run in runs:
+                run.close()
+                os.remove(run.name)
+
+
+def _write_run(directory, keys):
+    """把有序的去重键写入新文件，返回以只读方式打开的文件"""
+    fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        for key in keys:
+            f.write(key)
+    return open(path, 'rb')
+
+
+def _iter_run(run):
+    run.seek(0)
+    while True:
+        key = run.read(KEY_DIGEST_SIZE)
+        if not key:
+            return
+        yield key
+
+
+class _RunView:
+    """把有序文件包装为按下标读取定长记录的序列，供 bisect 使用"""
+
+    def __init__(self, run):
+        self.run = run
+        self.length = os.fstat(run.fileno()).st_size // KEY_DIGEST_SIZE
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        self.run.seek(index * KEY_DIGEST_SIZE)
+        return self.run.read(KEY_DIGEST_SIZE)
+
+
+def _run_contains(run, key):
+    """在有序文件中二分查找去重键"""
+    view = _RunView(run)
+    index = bisect.bisect_left(view, key)
+    return index < len(view) and view[index] == key
@@ -6,62 +6,396 @@
 """
 
 import random
+import hashlib
 import itertools
-from fraction import Fraction
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fraction import Fraction, OperationCounter
+import generator_stats
+from generator_stats import GeneratorStats
+
+
+# 去重键的字节数（64位摘要）
+KEY_DIGEST_SIZE = 8
+
+# 并行生成时单个分片的最大题目数，限制每轮在内存中的结果数量
+PARALLEL_SHARD_SIZE = 10000
+
+# 使用题库时每批查询和写入的题目数
+BANK_BATCH_SIZE = 1000
+
+
+class ConstraintError(ValueError):
+    """表达式违反题目约束，reason 为 generator_stats 中定义的拒绝原因"""
+    
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
 
 
 class ExpressionGenerator:
     """表达式生成器"""
     
-    def __init__(self, max_value=10):
+    def __init__(self, max_value=10, constructive=False, batch_size=None,
+                 collect_stats=False, use_index=None, bank=None, pool_size=None,
+                 dedup=None):
         self.max_value = max_value
         self.operators = ['+', '-', '×', '÷']
-        self.generated_expressions = set()
+        # 复用该范围内常见的真分数对象，减少分配
+        Fraction.intern(max_value)
+        # 已生成题目的规范形式摘要，用于去重；dedup 可传入内存固定的
+        # dedup.BloomKeySet 代替 set
+        self.generated_expressions = set() if dedup is None else dedup
+        # 构造式生成：根据已计算出的子树取值挑选操作数，使约束天然成立
+        self.constructive = constructive
+        # 批量模式：按模板成批抽取操作数并向量化求值（需要 numpy）
+        self.batch_size = batch_size
+        self._templates = None
+        # 穷举索引：None 表示数值范围足够小时自动使用
+        self.use_index = use_index
+        self._index = None
+        # 子表达式池：相同的子表达式只求值、格式化一次，pool_size 为最多保留的节点数
+        self.pool_size = pool_size
+        self._pool = None
+        if pool_size:
+            from expression_pool import ExpressionPool
+            self._pool = ExpressionPool(self, pool_size)
+        # 题库（QuestionBank）：跨多次运行去重，并保存新生成的题目
+        self.bank = bank
+        # 尝试、拒绝、重复等计数；collect_stats 为 True 时还记录各阶段耗时
+        self.stats = GeneratorStats(timing=collect_stats)
+    
+    @property
+    def attempts(self):
+        """尝试次数"""
+        return self.stats.attempts
+    
+    @property
+    def rejections(self):
+        """因违反约束而被丢弃的次数"""
+        return self.stats.total_rejections()
     
     def generate_expressions(self, count):
         """生成指定数量的表达式"""
         exercises = []
         answers = []
+        for exercise, answer in self.iter_expressions(count):
+            exercises.append(exercise)
+            answers.append(answer)
+        return exercises, answers
+    
+    def iter_expressions(self, count):
+        """逐个生成表达式，产出 (题目, 答案)
+
+        除去重集合外不保留已生成的题目，适合边生成边写文件。
+        """
+        for _, exercise, answer in self.iter_records(count):
+            yield exercise, answer
+    
+    def iter_records(self, count):
+        """逐个生成题目，产出 (去重键, 题目, 答案)"""
+        if self.bank is not None:
+            return self._iter_banked_records(count)
+        return self._iter_records(count)
+    
+    def generate_expressions_parallel(self, count, workers, seed=None):
+        """多进程生成指定数量的表达式"""
+        exercises = []
+        answers = []
+        for exercise, answer in self.iter_expressions_parallel(count, workers, seed):
+            exercises.append(exercise)
+            answers.append(answer)
+        return exercises, answers
+    
+    def iter_expressions_parallel(self, count, workers, seed=None):
+        """多进程逐批生成表达式，产出 (题目, 答案)"""
+        for _, exercise, answer in self.iter_records_parallel(count, workers, seed):
+            yield exercise, answer
+    
+    def iter_records_parallel(self, count, workers, seed=None):
+        """多进程逐批生成题目，产出 (去重键, 题目, 答案)
+
+        每轮把剩余数量平均分给各工作进程（每个分片不超过
+        PARALLEL_SHARD_SIZE），工作进程使用由 (seed, 轮次, 进程序号)
+        确定的随机种子，主进程按进程序号依次合并并做全局去重，
+        因此相同的 seed 和 workers 总是得到相同的结果。
+        """
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        
+        if self._get_index() is not None:
+            # 使用穷举索引时抽样本身是 O(n) 的，无需并行
+            random.seed(seed)
+            yield from self.iter_records(count)
+            return
+        
+        produced = 0
+        round_index = 0
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while produced < count:
+                remaining = count - produced
+                shard_size = min(-(-remaining // workers), PARALLEL_SHARD_SIZE)
+                seeds = [f"{seed}-{round_index}-{worker}" for worker in range(workers)]
+                shards = pool.map(_generate_shard,
+                                  [self._options()] * workers,
+                                  seeds,
+                                  [shard_size] * workers)
+                
+                for records, stats in shards:
+                    # 工作进程各自统计，主进程只修正全局去重的结果
+                    self.stats.merge(stats)
+                    self.stats.accepted -= len(records)
+                    fresh = []
+                    for record in records:
+                        if produced + len(fresh) >= count:
+                            break
+                        if record[0] not in self.generated_expressions:
+                            self.generated_expressions.add(record[0])
+                            self.stats.accepted += 1
+                            fresh.append(record)
+                        else:
+                            self.stats.duplicates += 1
+                    
+                    if self.bank is not None:
+                        fresh = self._filter_banked(fresh)
+                    produced += len(fresh)
+                    yield from fresh
+                
+                round_index += 1
+    
+    def capacity(self):
+        """使用穷举索引时返回不重复题目的总数，否则返回 None（视为无限）"""
+        index = self._get_index()
+        return None if index is None else index.capacity
+    
+    def remaining_capacity(self):
+        """使用穷举索引时返回还能生成的不重复题目数，否则返回 None
+
+        扣除已生成（追加模式下包括文件中已有）的题目和题库中已有的题目。
+        题库的去重键不区分数值范围，其他范围下保存的题目也可能在本范围的索引中，
+        因此按索引中的每道题查询题库。
+        """
+        index = self._get_index()
+        if index is None:
+            return None
+        if self.bank is not None:
+            self._exclude_banked(index)
+        excluded = self.generated_expressions
+        return index.capacity - sum(1 for key in index.keys() if key in excluded)
+    
+    def _exclude_banked(self, index):
+        """把索引中已在题库里的题目加入已生成的集合，抽样时不再抽中"""
+        self.generated_expressions.update(
+            self.bank.existing_keys(index.keys()))
+    
+    def _get_index(self):
+        """按需加载穷举索引，不使用索引时返回 None"""
+        if self._index is None:
+            from question_index import QuestionIndex, fits_index
+            
+            use_index = self.use_index
+            if use_index is None:
+                use_index = fits_index(self.max_value)
+            # 不使用索引的决定也记下来（False），之后不再重新判断
+            self._index = QuestionIndex.load_or_build(self) if use_index else False
+        return None if self._index is False else self._index
+    
+    def _iter_index_records(self, index, count):
+        """从穷举索引中无放回抽样，产出 (去重键, 题目, 答案)
+
+        题目数量超过剩余的不重复题目时立即抛出 ValueError。
+        """
+        records = index.sample(count, exclude=self.generated_expressions)
+        self.stats.attempts += count
+        self.stats.accepted += count
+        for record in records:
+            self.generated_expressions.add(record[0])
+            yield record
+    
+    def _iter_banked_records(self, count):
+        """逐批生成并经题库过滤，产出题库中尚未出现的 (去重键, 题目, 答案)"""
+        index = self._get_index()
+        if index is not None:
+            # 穷举索引抽样时直接排除题库中已有的题目，避免反复抽中
+            self._exclude_banked(index)
         
-        while len(exercises) < count:
+        produced = 0
+        while produced < count:
+            batch = list(self._iter_records(min(count - produced, BANK_BATCH_SIZE)))
+            for record in self._filter_banked(batch):
+                produced += 1
+                yield record
+    
+    def _filter_banked(self, records):
+        """一次查询剔除题库中已有的题目，并在一个事务中保存其余的新题目"""
+        existing = self.bank.existing_keys(key for key, _, _ in records)
+        if existing:
+            records = [record for record in records if record[0] not in existing]
+            self.stats.accepted -= len(existing)
+            self.stats.duplicates += len(existing)
+        self.bank.add(records, self.max_value)
+        return records
+    
+    def _options(self):
+        """构造参数，用于在工作进程中创建相同配置的生成器"""
+        return {'max_value': self.max_value,
+                'constructive': self.constructive,
+                'batch_size': self.batch_size,
+                'collect_stats': self.stats.timing,
+                'use_index': False,
+                'pool_size': self.pool_size}
+    
+    def _iter_records(self, count):
+        """逐个生成题目，产出 (去重键, 题目, 答案)"""
+        index = self._get_index()
+        if index is not None:
+            yield from self._iter_index_records(index, count)
+            return
+        
+        if self.batch_size:
+            yield from self._iter_batch_records(count)
+            return
+        
+        stats = self.stats
+        produced = 0
+        
+        while produced < count:
+            stats.attempts += 1
             try:
                 # 随机选择运算符数量（1-3个）
                 operator_count = random.randint(1, 3)
-                expression, result = self._generate_single_expression(operator_count)
-                
-                # 检查是否重复
-                normalized_expr = self._normalize_expression(expression)
-                if normalized_expr not in self.generated_expressions:
-                    self.generated_expressions.add(normalized_expr)
-                    exercises.append(expression)
-                    answers.append(result.to_string())
-                    
+                tree, result = self._generate_single_tree(operator_count)
+            except ConstraintError as e:
+                # 违反约束（如除数为零），重新生成
+                stats.reject(e.reason)
+                continue
             except (ValueError, ZeroDivisionError):
-                # 如果生成过程中出现错误（如除数为零），重新生成
+                stats.reject(generator_stats.OTHER)
                 continue
+            
+            record = self._accept(tree, result)
+            if record is not None:
+                produced += 1
+                yield record
+    
+    def _accept(self, tree, result):
+        """去重并格式化一道题，重复时返回 None
+
+        在格式化之前按规范形式检查是否重复。
+        """
+        stats = self.stats
+        if stats.timing:
+            start = time.perf_counter()
+            key = self._canonical_key(tree)
+            normalized = time.perf_counter()
+            stats.timings['normalize'] += normalized - start
+        else:
+            key = self._canonical_key(tree)
         
-        return exercises, answers
+        if key in self.generated_expressions:
+            stats.duplicates += 1
+            return None
+        
+        self.generated_expressions.add(key)
+        stats.accepted += 1
+        record = (key, self._tree_to_string(tree), result.to_string())
+        if stats.timing:
+            stats.timings['format'] += time.perf_counter() - normalized
+        return record
+    
+    def _iter_batch_records(self, count):
+        """批量模式：每次按模板向量化求值 batch_size 个候选，产出 (去重键, 题目, 答案)"""
+        from batch_evaluator import enumerate_templates, generate_batch
+        
+        if self._templates is None:
+            self._templates = enumerate_templates(self.operators)
+        
+        stats = self.stats
+        produced = 0
+        while produced < count:
+            # 剩余数量较少时缩小批量，避免求值大量用不到的候选
+            size = min(self.batch_size, 2 * (count - produced) + 64)
+            if stats.timing:
+                start = time.perf_counter()
+            results, rejections = generate_batch(self._templates, self.max_value, size)
+            if stats.timing:
+                stats.timings['evaluate'] += time.perf_counter() - start
+            stats.attempts += len(results)
+            for reason, rejected in rejections.items():
+                stats.attempts += rejected
+                stats.reject(reason, rejected)
+            
+            for tree, result in results:
+                record = self._accept(tree, result)
+                if record is not None:
+                    produced += 1
+                    yield record
+                    if produced >= count:
+                        return
+    
+    def rejection_rate(self):
+        """因违反约束而被丢弃的尝试所占比例"""
+        return self.stats.rejection_rate()
+    
+    def reset(self):
+        """清空去重集合和统计，开始一批新的题目
+
+        穷举索引、批量模板和子表达式池等与题目无关的状态保留，可在多次任务间复用。
+        """
+        self.generated_expressions.clear()
+        self.stats = GeneratorStats(timing=self.stats.timing)
     
     def _generate_single_expression(self, operator_count):
         """生成单个表达式"""
-        # 生成操作数
-        numbers = [Fraction.random_number(self.max_value) 
-                  for _ in range(operator_count + 1)]
+        expression_tree, result = self._generate_single_tree(operator_count)
+        
+        # 转换为字符串表达式
+        expression_str = self._tree_to_string(expression_tree)
+        
+        return expression_str, result
+    
+    def _generate_single_tree(self, operator_count):
+        """生成单个表达式树，返回 (表达式树, 结果)"""
+        timing = self.stats.timing
+        if timing:
+            start = time.perf_counter()
         
         # 生成运算符
         operators = [random.choice(self.operators) 
                     for _ in range(operator_count)]
         
-        # 构建表达式树
-        expression_tree = self._build_expression_tree(numbers, operators)
+        if self.constructive:
+            # 先确定树的形状，再自底向上挑选满足约束的操作数
+            shape = self._build_expression_tree([None] * (operator_count + 1),
+                                                operators)
+        else:
+            # 生成操作数
+            numbers = [Fraction.random_number(self.max_value) 
+                      for _ in range(operator_count + 1)]
+            
+            # 构建表达式树
+            expression_tree = self._build_expression_tree(numbers, operators)
         
-        # 计算表达式结果
-        result = self._evaluate_expression_tree(expression_tree)
+        if timing:
+            built = time.perf_counter()
+            self.stats.timings['build'] += built - start
         
-        # 转换为字符串表达式
-        expression_str = self._tree_to_string(expression_tree)
+        try:
+            if self.constructive:
+                expression_tree, result = self._construct_tree(shape)
+            elif self._pool is not None:
+                # 返回池中的节点，之后的去重和格式化也直接使用节点上的缓存
+                expression_tree = self._pool.intern(expression_tree)
+                result = expression_tree.value
+            else:
+                # 计算表达式结果
+                result = self._evaluate_expression_tree(expression_tree)
+        finally:
+            if timing:
+                self.stats.timings['evaluate'] += time.perf_counter() - built
         
-        return expression_str, result
+        return expression_tree, result
     
     def _build_expression_tree(self, numbers, operators):
         """构建表达式树，考虑运算符优先级"""
@@ -102,28 +436,121 @@ class ExpressionGenerator:
         left_val = self._evaluate_expression_tree(left)
         right_val = self._evaluate_expression_tree(right)
         
-        # 检查约束条件
-        if op == '-' and left_val < right_val:
-            raise ValueError("减法结果不能为负数")
-        if op == '÷' and right_val == Fraction(0, 1):
-            raise ValueError("除数不能为零")
-        if op == '÷' and not (left_val / right_val).is_proper():
-            raise ValueError("除法结果必须为真分数")
-        
-        # 执行运算
+        return self._apply_operator(op, left_val, right_val)
+    
+    def _apply_operator(self, op, left_val, right_val):
+        """检查约束条件并执行一次运算"""
         if op == '+':
             return left_val + right_val
         elif op == '-':
+            if left_val < right_val:
+                raise ConstraintError("减法结果不能为负数",
+                                      generator_stats.NEGATIVE_SUBTRACTION)
             return left_val - right_val
         elif op == '×':
             return left_val * right_val
         elif op == '÷':
-            return left_val / right_val
+            if right_val == Fraction(0, 1):
+                raise ConstraintError("除数不能为零", generator_stats.ZERO_DIVISOR)
+            result = left_val / right_val
+            if not result.is_proper():
+                raise ConstraintError("除法结果必须为真分数",
+                                      generator_stats.IMPROPER_QUOTIENT)
+            return result
+    
+    def _construct_tree(self, shape):
+        """按形状构造表达式树，返回 (表达式树, 结果)
+
+        形状中的叶子为 None。减法和除法的操作数根据另一侧已计算出的值挑选，
+        只有另一侧也是子树（无法再挑选）时才可能违反约束。
+        """
+        if shape is None:
+            number = Fraction.random_number(self.max_value)
+            return number, number
+        
+        op, left, right = shape
+        if left is None and right is not None:
+            right_tree, right_val = self._construct_tree(right)
+            left_tree = left_val = self._pick_left_operand(op, right_val)
+        else:
+            left_tree, left_val = self._construct_tree(left)
+            if right is None:
+                right_tree = right_val = self._pick_right_operand(op, left_val)
+            else:
+                right_tree, right_val = self._construct_tree(right)
+        
+        result = self._apply_operator(op, left_val, right_val)
+        return (op, left_tree, right_tree), result
+    
+    def _pick_right_operand(self, op, left_val):
+        """已知左侧的值，挑选满足约束的右操作数"""
+        if op == '-':
+            # 右操作数不大于左侧
+            return self._random_operand(upper=left_val)
+        if op == '÷':
+            # 右操作数大于左侧，商为真分数且除数不为零
+            return self._random_operand(lower=left_val, strict_lower=True)
+        return Fraction.random_number(self.max_value)
+    
+    def _pick_left_operand(self, op, right_val):
+        """已知右侧的值，挑选满足约束的左操作数"""
+        if op == '-':
+            return self._random_operand(lower=right_val)
+        if op == '÷':
+            return self._random_operand(upper=right_val, strict_upper=True)
+        return Fraction.random_number(self.max_value)
+    
+    def _random_operand(self, lower=None, upper=None,
+                        strict_lower=False, strict_upper=False):
+        """在给定区间内随机挑选操作数（整数或真分数）
+
+        取值范围与 Fraction.random_number 相同，区间内没有可选值时抛出 ValueError。
+        """
+        def numerator_range(denominator, max_numerator, min_numerator):
+            # 将区间 [lower, upper] 换算为该分母下分子的取值范围
+            low, high = min_numerator, max_numerator
+            if lower is not None:
+                scaled = lower * denominator
+                floor_val = scaled.numerator // scaled.denominator
+                if strict_lower or scaled.denominator != 1:
+                    low = max(low, floor_val + 1)
+                else:
+                    low = max(low, floor_val)
+            if upper is not None:
+                scaled = upper * denominator
+                floor_val = scaled.numerator // scaled.denominator
+                if strict_upper and scaled.denominator == 1:
+                    high = min(high, floor_val - 1)
+                else:
+                    high = min(high, floor_val)
+            return low, high
+        
+        if random.random() < 0.3:  # 与 random_number 相同的分数概率
+            denominator = random.randint(2, self.max_value)
+            low, high = numerator_range(denominator, denominator - 1, 1)
+            if low <= high:
+                return Fraction(random.randint(low, high), denominator)
+        
+        low, high = numerator_range(1, self.max_value - 1, 0)
+        if low <= high:
+            return Fraction(random.randint(low, high), 1)
+        
+        # 没有满足条件的整数时，退而在所有分母中寻找真分数
+        denominators = list(range(2, self.max_value + 1))
+        random.shuffle(denominators)
+        for denominator in denominators:
+            low, high = numerator_range(denominator, denominator - 1, 1)
+            if low <= high:
+                return Fraction(random.randint(low, high), denominator)
+        
+        raise ConstraintError("没有满足约束的操作数", generator_stats.NO_OPERAND)
     
     def _tree_to_string(self, tree):
         """将表达式树转换为字符串"""
         if isinstance(tree, Fraction):
             return tree.to_string()
+        if not isinstance(tree, tuple):
+            return self._pool.text(tree)
         
         op, left, right = tree
         left_str = self._tree_to_string(left)
@@ -160,20 +587,49 @@ class ExpressionGenerator:
                 return True
             return child_prec <= parent_prec
     
-    def _normalize_expression(self, expression):
-        """标准化表达式以检测重复"""
-        # 移除所有空格
-        expr = expression.replace(' ', '')
-        
-        # 将运算符转换为标准形式
-        expr = expr.replace('×', '*')
-        expr = expr.replace('÷', '/')
+    def _canonical_form(self, tree):
+        """表达式树的规范形式
+
+        按题目要求，只有交换 + 和 × 的左右操作数得到的题目视为重复，
+        因此对可交换运算的两个子树排序；不做结合律展开，
+        1 + 2 + 3 与 3 + 2 + 1 仍是不同的题目。
+        """
+        if isinstance(tree, Fraction):
+            return f"{tree.numerator}/{tree.denominator}"
         
-        # 这里可以添加更复杂的标准化逻辑
-        # 比如重新排序可交换的运算符
+        op, left, right = tree
+        left_form = self._canonical_form(left)
+        right_form = self._canonical_form(right)
+        if self._is_commutative(op) and right_form < left_form:
+            left_form, right_form = right_form, left_form
         
-        return expr
+        return f"({left_form}{op}{right_form})"
+    
+    def _canonical_key(self, tree):
+        """规范形式的定长摘要，作为去重键"""
+        if isinstance(tree, (Fraction, tuple)):
+            form = self._canonical_form(tree)
+        else:
+            form = self._pool.form(tree)
+        form = form.encode('utf-8')
+        return hashlib.blake2b(form, digest_size=KEY_DIGEST_SIZE).digest()
     
     def _is_commutative(self, op):
         """判断运算符是否可交换"""
-        return op in ['+', '×']
\ No newline at end of file
+        return op in ['+', '×']
+
+
+def _generate_shard(options, seed, count):
+    """工作进程入口：用给定种子生成一个分片
+
+    返回 (题目记录列表, 生成统计)。
+    """
+    random.seed(seed)
+    generator = ExpressionGenerator(**options)
+    if options.get('collect_stats'):
+        with OperationCounter() as counter:
+            records = list(generator._iter_records(count))
+        generator.stats.add_fraction_operations(counter.counts)
+    else:
+        records = list(generator._iter_records(count))
+    return records, generator.stats
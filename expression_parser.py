@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表达式解析模块
+单遍词法分析 + 优先级解析，构建与 ExpressionGenerator 相同结构的表达式树
+"""
+
+import re
+from fraction import Fraction
+
+
+# 词法规则：带分数、真分数、整数、运算符、括号
+# 分数中的 '/' 必须紧贴数字，单独出现（两侧有空格）的 '/' 视为除号
+_TOKEN_PATTERN = re.compile(
+    r"\s*(?:(\d+)'(\d+)/(\d+)|(\d+)/(\d+)|(\d+)|([-+×÷*/()]))"
+)
+
+# 运算符统一为题目文件中的符号
+_OPERATOR_ALIASES = {'+': '+', '-': '-', '×': '×', '*': '×', '÷': '÷', '/': '÷'}
+
+_PRECEDENCE = {'+': 1, '-': 1, '×': 2, '÷': 2}
+
+
+def tokenize(expression):
+    """将表达式字符串切分为记号列表
+
+    数字记号为 Fraction，运算符与括号记号为字符串。
+    """
+    tokens = []
+    pos = 0
+    length = len(expression)
+    match = _TOKEN_PATTERN.match
+
+    while pos < length:
+        m = match(expression, pos)
+        if m is None:
+            if expression[pos:].strip() == '':
+                break
+            raise ValueError(f"无法识别的字符: {expression[pos:]!r}")
+
+        whole, mixed_num, mixed_den, num, den, integer, symbol = m.groups()
+        if symbol is not None:
+            tokens.append(_OPERATOR_ALIASES.get(symbol, symbol))
+        elif integer is not None:
+            tokens.append(Fraction(int(integer), 1))
+        elif num is not None:
+            tokens.append(Fraction(int(num), int(den)))
+        else:
+            denominator = int(mixed_den)
+            tokens.append(Fraction(int(whole) * denominator + int(mixed_num),
+                                   denominator))
+        pos = m.end()
+
+    return tokens
+
+
+def parse_expression(expression):
+    """解析表达式字符串，返回表达式树
+
+    树的结构与 ExpressionGenerator 一致：叶子为 Fraction，
+    内部节点为 (运算符, 左子树, 右子树)。
+    """
+    tokens = tokenize(expression)
+    if not tokens:
+        raise ValueError("表达式为空")
+
+    tree, pos = _parse_binary(tokens, 0, 1)
+    if pos != len(tokens):
+        raise ValueError("表达式格式错误")
+    return tree
+
+
+def _parse_binary(tokens, pos, min_precedence):
+    """优先级爬升解析二元运算（左结合）"""
+    left, pos = _parse_primary(tokens, pos)
+
+    while pos < len(tokens):
+        op = tokens[pos]
+        precedence = _PRECEDENCE.get(op) if isinstance(op, str) else None
+        if precedence is None or precedence < min_precedence:
+            break
+        right, pos = _parse_binary(tokens, pos + 1, precedence + 1)
+        left = (op, left, right)
+
+    return left, pos
+
+
+def _parse_primary(tokens, pos):
+    """解析操作数或括号内的子表达式"""
+    if pos >= len(tokens):
+        raise ValueError("表达式不完整")
+
+    token = tokens[pos]
+    if isinstance(token, Fraction):
+        return token, pos + 1
+    if token == '(':
+        tree, pos = _parse_binary(tokens, pos + 1, 1)
+        if pos >= len(tokens) or tokens[pos] != ')':
+            raise ValueError("括号不匹配")
+        return tree, pos + 1
+
+    raise ValueError(f"意外的记号: {token}")
+
+
+def evaluate_tree(tree):
+    """计算表达式树的结果
+
+    与题目约束一致：减法结果不能为负数，除数不能为零。
+    """
+    if isinstance(tree, Fraction):
+        return tree
+
+    op, left, right = tree
+    left_val = evaluate_tree(left)
+    right_val = evaluate_tree(right)
+
+    if op == '+':
+        return left_val + right_val
+    elif op == '-':
+        if left_val < right_val:
+            raise ValueError("减法结果不能为负数")
+        return left_val - right_val
+    elif op == '×':
+        return left_val * right_val
+    else:
+        if right_val.numerator == 0:
+            raise ValueError("除数不能为零")
+        return left_val / right_val
+
+
+def evaluate_expression(expression):
+    """解析并计算表达式字符串"""
+    return evaluate_tree(parse_expression(expression))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+子表达式池模块
+对子表达式做哈希共享（hash-consing）：同一运算符作用于相同子节点的子表达式
+只保存一份，其求值结果、约束检查结果、题目字符串和规范形式都只计算一次
+"""
+
+import itertools
+from collections import OrderedDict
+from expression import ConstraintError
+
+
+# 默认最多保留的子表达式节点数
+DEFAULT_POOL_SIZE = 65536
+
+
+class PoolNode:
+    """池中的子表达式节点
+
+    叶子节点的 op 为 None；error 为违反约束时的 (说明, 拒绝原因)，
+    此时 value 无意义。text 和 form 在第一次用到时才计算。
+    """
+
+    __slots__ = ('uid', 'op', 'left', 'right', 'tree', 'value', 'error', 'text', 'form')
+
+    def __init__(self, uid, op, left, right, tree, value, error):
+        self.uid = uid
+        self.op = op
+        self.left = left
+        self.right = right
+        # 与生成器相同的元组形式，用于判断括号
+        self.tree = tree
+        self.value = value
+        self.error = error
+        self.text = None
+        self.form = None
+
+
+class ExpressionPool:
+    """按 (运算符, 左节点编号, 右节点编号) 唯一化的子表达式池
+
+    hits 和 misses 统计运算节点的命中与新建次数。
+    节点数超过 max_size 时按最近最少使用的顺序淘汰。被淘汰的节点仍可被
+    已有的父节点引用；重新创建时会得到新的编号，只影响命中率，不影响结果。
+    """
+
+    def __init__(self, generator, max_size=DEFAULT_POOL_SIZE):
+        # 求值规则、括号规则和可交换性都取自生成器，保证与不使用池时一致
+        self.generator = generator
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._nodes = OrderedDict()
+        self._leaves = {}
+        self._uids = itertools.count()
+
+    def __len__(self):
+        return len(self._nodes) + len(self._leaves)
+
+    def intern(self, tree):
+        """把表达式树转换为池中的节点，违反约束时抛出 ConstraintError"""
+        if tree.__class__ is not tuple:
+            node = self._leaves.get(id(tree))
+            if node is None:
+                node = self.leaf(tree)
+            return node
+
+        op, left, right = tree
+        left = self.intern(left)
+        right = self.intern(right)
+        key = (op, left.uid, right.uid)
+        node = self._nodes.get(key)
+        if node is None:
+            node = self._create(key, op, left, right)
+        else:
+            self._nodes.move_to_end(key)
+            self.hits += 1
+        if node.error is not None:
+            raise ConstraintError(*node.error)
+        return node
+
+    def leaf(self, value):
+        """操作数对应的叶子节点
+
+        按对象身份查找：Fraction 会复用常见取值的对象，查找时无需计算哈希；
+        节点持有该对象，因此表中的 id 不会被其他对象复用。
+        """
+        node = self._leaves.get(id(value))
+        if node is None:
+            if len(self._leaves) >= self.max_size:
+                # 叶子只随数值范围增长，超过上限时整体清空即可
+                self._leaves.clear()
+            node = PoolNode(next(self._uids), None, None, None, value, value, None)
+            self._leaves[id(value)] = node
+        return node
+
+    def node(self, op, left, right):
+        """op 作用于两个节点得到的节点（可能违反约束，见 error）"""
+        key = (op, left.uid, right.uid)
+        node = self._nodes.get(key)
+        if node is None:
+            return self._create(key, op, left, right)
+        self._nodes.move_to_end(key)
+        self.hits += 1
+        return node
+
+    def text(self, node):
+        """节点对应的题目字符串"""
+        if node.text is None:
+            if node.op is None:
+                node.text = node.value.to_string()
+            else:
+                generator = self.generator
+                left_str = self.text(node.left)
+                right_str = self.text(node.right)
+                if node.left.op is not None and \
+                        generator._need_parentheses(node.left.tree, node.op, 'left'):
+                    left_str = f"({left_str})"
+                if node.right.op is not None and \
+                        generator._need_parentheses(node.right.tree, node.op, 'right'):
+                    right_str = f"({right_str})"
+                node.text = f"{left_str} {node.op} {right_str}"
+        return node.text
+
+    def form(self, node):
+        """节点的规范形式，与 ExpressionGenerator._canonical_form 相同"""
+        if node.form is None:
+            if node.op is None:
+                node.form = f"{node.value.numerator}/{node.value.denominator}"
+            else:
+                left_form = self.form(node.left)
+                right_form = self.form(node.right)
+                if self.generator._is_commutative(node.op) and right_form < left_form:
+                    left_form, right_form = right_form, left_form
+                node.form = f"({left_form}{node.op}{right_form})"
+        return node.form
+
+    def _create(self, key, op, left, right):
+        """求值并加入池中，超过上限时淘汰最久未使用的节点"""
+        self.misses += 1
+        value = error = None
+        try:
+            value = self.generator._apply_operator(op, left.value, right.value)
+        except ConstraintError as e:
+            error = (str(e), e.reason)
+        node = PoolNode(next(self._uids), op, left, right,
+                        (op, left.tree, right.tree), value, error)
+
+        nodes = self._nodes
+        nodes[key] = node
+        if len(nodes) > self.max_size:
+            nodes.popitem(last=False)
+        return node
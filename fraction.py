@@ -5,26 +5,94 @@
 支持真分数的加减乘除运算
 """
 
-import math
+from math import gcd
+from operator import index
 import random
 
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，只有 FractionArray 需要
+    np = None
+
+
+# 预先创建的小整数，0..255 直接复用同一对象
+_SMALL_INTEGER_LIMIT = 256
+
+# 驻留的真分数：_INTERNED_ROWS[分母][分子] -> Fraction，以及当前已驻留的最大分母
+_INTERNED_ROWS = [None, None]
+_interned_denominator_limit = 1
+
+# 驻留真分数的分母上限，避免 -r 很大时缓存本身占用过多内存
+INTERN_MAX_DENOMINATOR = 100
+
+# 两分母之积小于该值时，一次 gcd 就很快，直接运算后约分比先交叉约分
+# 多一次 gcd 调用更划算；超过时才按最小公倍数通分、先交叉约分再相乘
+_CROSS_REDUCE_LIMIT = 1 << 60
+
 
 class Fraction:
-    """真分数类"""
+    """真分数类
+
+    不可变的值类型：分子分母在创建时约分后不再改变，可以作为字典键和集合元素。
+    小整数和已驻留的真分数复用同一对象，运算结果对整数分母走快速路径。
+    """
     
-    def __init__(self, numerator=0, denominator=1):
-        if denominator == 0:
-            raise ValueError("分母不能为零")
-        
-        # 确保分母为正数
-        if denominator < 0:
-            numerator = -numerator
-            denominator = -denominator
+    __slots__ = ('_numerator', '_denominator')
+    
+    def __new__(cls, numerator=0, denominator=1):
+        if type(numerator) is not int:
+            numerator = _as_integer(numerator)
+        if type(denominator) is not int:
+            denominator = _as_integer(denominator)
+        if denominator != 1:
+            if denominator == 0:
+                raise ValueError("分母不能为零")
             
-        # 约分
-        gcd_val = math.gcd(abs(numerator), denominator)
-        self.numerator = numerator // gcd_val
-        self.denominator = denominator // gcd_val
+            # 确保分母为正数
+            if denominator < 0:
+                numerator = -numerator
+                denominator = -denominator
+            
+            # 约分
+            gcd_val = gcd(numerator, denominator)
+            if gcd_val != 1:
+                numerator //= gcd_val
+                denominator //= gcd_val
+        
+        if cls is Fraction:
+            return _make(numerator, denominator)
+        
+        self = object.__new__(cls)
+        self._numerator = numerator
+        self._denominator = denominator
+        return self
+    
+    @property
+    def numerator(self):
+        return self._numerator
+    
+    @property
+    def denominator(self):
+        return self._denominator
+    
+    def __reduce__(self):
+        # 通过构造函数重建，避免反序列化时改写驻留对象
+        return (self.__class__, (self._numerator, self._denominator))
+    
+    def __repr__(self):
+        return f"Fraction({self._numerator}, {self._denominator})"
+    
+    @staticmethod
+    def intern(max_value):
+        """驻留分母不超过 max_value 的所有真分数（最多到 INTERN_MAX_DENOMINATOR）"""
+        global _interned_denominator_limit
+        limit = min(max_value, INTERN_MAX_DENOMINATOR)
+        for denominator in range(_interned_denominator_limit + 1, limit + 1):
+            # 不互质的位置不会被访问（传入 _make 的分子分母已经约分）
+            _INTERNED_ROWS.append([_new(numerator, denominator)
+                                   if gcd(numerator, denominator) == 1 else None
+                                   for numerator in range(denominator)])
+        _interned_denominator_limit = max(_interned_denominator_limit, limit)
     
     @classmethod
     def from_string(cls, s):
@@ -49,74 +117,137 @@ class Fraction:
     
     def to_string(self):
         """转换为字符串表示"""
-        if self.denominator == 1:
-            return str(self.numerator)
-        elif abs(self.numerator) < self.denominator:
-            return f"{self.numerator}/{self.denominator}"
-        else:
-            whole = self.numerator // self.denominator
-            numerator = abs(self.numerator) % self.denominator
-            if numerator == 0:
-                return str(whole)
-            else:
-                return f"{whole}'{numerator}/{self.denominator}"
+        return _format_fraction(self._numerator, self._denominator)
     
     def __add__(self, other):
+        if isinstance(other, Fraction):
+            na, da = self._numerator, self._denominator
+            nb, db = other._numerator, other._denominator
+            if db == 1:
+                # 加整数不改变分母，结果无需约分
+                return _make(na + nb * da, da)
+            if da == 1:
+                return _make(na * db + nb, db)
+            denominator = da * db
+            if denominator < _CROSS_REDUCE_LIMIT:
+                return _reduce(na * db + nb * da, denominator)
+            return _add_reduced(na, da, nb, db)
         if isinstance(other, int):
-            other = Fraction(other, 1)
-        numerator = (self.numerator * other.denominator + 
-                    other.numerator * self.denominator)
-        denominator = self.denominator * other.denominator
-        return Fraction(numerator, denominator)
+            return _make(self._numerator + other * self._denominator, self._denominator)
+        return NotImplemented
+    
+    __radd__ = __add__
     
     def __sub__(self, other):
+        if isinstance(other, Fraction):
+            na, da = self._numerator, self._denominator
+            nb, db = other._numerator, other._denominator
+            if db == 1:
+                return _make(na - nb * da, da)
+            if da == 1:
+                return _make(na * db - nb, db)
+            denominator = da * db
+            if denominator < _CROSS_REDUCE_LIMIT:
+                return _reduce(na * db - nb * da, denominator)
+            return _add_reduced(na, da, -nb, db)
         if isinstance(other, int):
-            other = Fraction(other, 1)
-        numerator = (self.numerator * other.denominator - 
-                    other.numerator * self.denominator)
-        denominator = self.denominator * other.denominator
-        return Fraction(numerator, denominator)
+            return _make(self._numerator - other * self._denominator, self._denominator)
+        return NotImplemented
+    
+    def __rsub__(self, other):
+        if isinstance(other, int):
+            return _make(other * self._denominator - self._numerator, self._denominator)
+        return NotImplemented
     
     def __mul__(self, other):
+        if isinstance(other, Fraction):
+            na, da = self._numerator, self._denominator
+            nb, db = other._numerator, other._denominator
+            if da == 1 and db == 1:
+                return _make(na * nb, 1)
+            denominator = da * db
+            if denominator < _CROSS_REDUCE_LIMIT:
+                return _reduce(na * nb, denominator)
+            return _multiply_reduced(na, da, nb, db)
         if isinstance(other, int):
-            other = Fraction(other, 1)
-        numerator = self.numerator * other.numerator
-        denominator = self.denominator * other.denominator
-        return Fraction(numerator, denominator)
+            gcd_val = gcd(other, self._denominator)
+            return _make(self._numerator * (other // gcd_val),
+                         self._denominator // gcd_val)
+        return NotImplemented
+    
+    __rmul__ = __mul__
     
     def __truediv__(self, other):
+        if isinstance(other, Fraction):
+            na, da = self._numerator, self._denominator
+            nb, db = other._numerator, other._denominator
+            if nb == 0:
+                raise ValueError("除数不能为零")
+            if nb < 0:
+                nb, db = -nb, -db
+            denominator = da * nb
+            if denominator < _CROSS_REDUCE_LIMIT:
+                return _reduce(na * db, denominator)
+            return _multiply_reduced(na, da, db, nb)
         if isinstance(other, int):
-            other = Fraction(other, 1)
-        if other.numerator == 0:
-            raise ValueError("除数不能为零")
-        numerator = self.numerator * other.denominator
-        denominator = self.denominator * other.numerator
-        return Fraction(numerator, denominator)
+            if other == 0:
+                raise ValueError("除数不能为零")
+            return Fraction(self._numerator, self._denominator * other)
+        return NotImplemented
+    
+    def __rtruediv__(self, other):
+        if isinstance(other, int):
+            if self._numerator == 0:
+                raise ValueError("除数不能为零")
+            return Fraction(other * self._denominator, self._numerator)
+        return NotImplemented
     
     def __eq__(self, other):
+        # 分数总是约分后的形式，分子分母分别相等即相等
+        if isinstance(other, Fraction):
+            return (self._numerator == other._numerator and
+                    self._denominator == other._denominator)
         if isinstance(other, int):
-            other = Fraction(other, 1)
-        return (self.numerator * other.denominator == 
-                other.numerator * self.denominator)
+            return self._denominator == 1 and self._numerator == other
+        return NotImplemented
+    
+    def __hash__(self):
+        # 与相等的整数哈希一致
+        if self._denominator == 1:
+            return hash(self._numerator)
+        return hash((self._numerator, self._denominator))
     
     def __lt__(self, other):
+        if isinstance(other, Fraction):
+            return self._numerator * other._denominator < other._numerator * self._denominator
         if isinstance(other, int):
-            other = Fraction(other, 1)
-        return (self.numerator * other.denominator < 
-                other.numerator * self.denominator)
+            return self._numerator < other * self._denominator
+        return NotImplemented
     
     def __le__(self, other):
-        return self < other or self == other
+        if isinstance(other, Fraction):
+            return self._numerator * other._denominator <= other._numerator * self._denominator
+        if isinstance(other, int):
+            return self._numerator <= other * self._denominator
+        return NotImplemented
     
     def __gt__(self, other):
-        return not self <= other
+        if isinstance(other, Fraction):
+            return self._numerator * other._denominator > other._numerator * self._denominator
+        if isinstance(other, int):
+            return self._numerator > other * self._denominator
+        return NotImplemented
     
     def __ge__(self, other):
-        return not self < other
+        if isinstance(other, Fraction):
+            return self._numerator * other._denominator >= other._numerator * self._denominator
+        if isinstance(other, int):
+            return self._numerator >= other * self._denominator
+        return NotImplemented
     
     def is_proper(self):
         """判断是否为真分数"""
-        return abs(self.numerator) < self.denominator
+        return abs(self._numerator) < self._denominator
     
     @staticmethod
     def random_fraction(max_value):
@@ -131,4 +262,505 @@ class Fraction:
         if random.random() < 0.3:  # 30%概率生成分数
             return Fraction.random_fraction(max_value)
         else:
-            return Fraction(random.randint(0, max_value - 1), 1)
\ No newline at end of file
+            return Fraction(random.randint(0, max_value - 1), 1)
+
+
+def _new(numerator, denominator):
+    """直接创建已约分的分数对象"""
+    self = object.__new__(Fraction)
+    self._numerator = numerator
+    self._denominator = denominator
+    return self
+
+
+def _format_fraction(numerator, denominator):
+    """把已约分的分子分母格式化为题目中的写法（整数、真分数或带分数）"""
+    if denominator == 1:
+        return str(numerator)
+    elif abs(numerator) < denominator:
+        return f"{numerator}/{denominator}"
+    else:
+        whole = numerator // denominator
+        numerator = abs(numerator) % denominator
+        if numerator == 0:
+            return str(whole)
+        else:
+            return f"{whole}'{numerator}/{denominator}"
+
+
+def _add_reduced(na, da, nb, db):
+    """两个已约分的分数相加，结果已约分
+
+    以两分母的最小公倍数为公分母：分母互质时结果无需约分，
+    否则只需用和与两分母的最大公约数约分，参与运算的整数都比直接通分小。
+    """
+    g = gcd(da, db)
+    if g == 1:
+        return _make(na * db + nb * da, da * db)
+    da //= g
+    numerator = na * (db // g) + nb * da
+    g2 = gcd(numerator, g)
+    if g2 != 1:
+        numerator //= g2
+        db //= g2
+    return _make(numerator, da * db)
+
+
+def _multiply_reduced(na, da, nb, db):
+    """两个已约分的分数相乘（db > 0），先交叉约分再相乘，结果已约分"""
+    g1 = gcd(na, db)
+    g2 = gcd(nb, da)
+    if g1 != 1:
+        na //= g1
+        db //= g1
+    if g2 != 1:
+        nb //= g2
+        da //= g2
+    return _make(na * nb, da * db)
+
+
+def _reduce(numerator, denominator):
+    """约分（分母为正）后得到分数"""
+    gcd_val = gcd(numerator, denominator)
+    if gcd_val != 1:
+        numerator //= gcd_val
+        denominator //= gcd_val
+    return _make(numerator, denominator)
+
+
+def _as_integer(value):
+    """把分子或分母转换为 int：接受 bool、numpy 整数等实现了 __index__ 的类型，
+    浮点数、字符串等抛出 TypeError"""
+    try:
+        return index(value)
+    except TypeError:
+        raise TypeError(f"分子和分母必须是整数，不能是 {type(value).__name__}") from None
+
+
+def _make(numerator, denominator):
+    """由已约分的分子分母得到分数，优先复用小整数和驻留的真分数"""
+    if denominator == 1:
+        if 0 <= numerator < _SMALL_INTEGER_LIMIT:
+            return _SMALL_INTEGERS[numerator]
+    elif denominator <= _interned_denominator_limit and 0 < numerator < denominator:
+        return _INTERNED_ROWS[denominator][numerator]
+    self = object.__new__(Fraction)
+    self._numerator = numerator
+    self._denominator = denominator
+    return self
+
+
+_SMALL_INTEGERS = [_new(value, 1) for value in range(_SMALL_INTEGER_LIMIT)]
+
+
+class LazyFraction(Fraction):
+    """延迟约分的分数
+
+    加减乘除的结果不约分，只在判断相等、求哈希、格式化或读取分子分母时
+    约分一次（约分结果保存在对象中，值不变）。大小比较直接交叉相乘，无需约分。
+    适合很长的运算链：省去每一步的 gcd，代价是中间整数变大，保存大量中间结果时
+    更占内存。与 Fraction 混合运算的结果为 LazyFraction。
+    """
+    
+    __slots__ = ('_reduced',)
+    
+    def __new__(cls, numerator=0, denominator=1):
+        if type(numerator) is not int:
+            numerator = _as_integer(numerator)
+        if type(denominator) is not int:
+            denominator = _as_integer(denominator)
+        if denominator == 0:
+            raise ValueError("分母不能为零")
+        if denominator < 0:
+            numerator = -numerator
+            denominator = -denominator
+        return _lazy(numerator, denominator)
+    
+    @property
+    def numerator(self):
+        self._normalize()
+        return self._numerator
+    
+    @property
+    def denominator(self):
+        self._normalize()
+        return self._denominator
+    
+    def __repr__(self):
+        self._normalize()
+        return f"LazyFraction({self._numerator}, {self._denominator})"
+    
+    def to_string(self):
+        self._normalize()
+        return _format_fraction(self._numerator, self._denominator)
+    
+    def to_fraction(self):
+        """转换为约分后的 Fraction"""
+        self._normalize()
+        return _make(self._numerator, self._denominator)
+    
+    def _normalize(self):
+        if not self._reduced:
+            gcd_val = gcd(self._numerator, self._denominator)
+            if gcd_val != 1:
+                self._numerator //= gcd_val
+                self._denominator //= gcd_val
+            self._reduced = True
+    
+    def __add__(self, other):
+        if isinstance(other, Fraction):
+            nb, db = other._numerator, other._denominator
+        elif isinstance(other, int):
+            nb, db = other, 1
+        else:
+            return NotImplemented
+        na, da = self._numerator, self._denominator
+        if da == db:
+            return _lazy(na + nb, da)
+        return _lazy(na * db + nb * da, da * db)
+    
+    __radd__ = __add__
+    
+    def __sub__(self, other):
+        if isinstance(other, Fraction):
+            nb, db = other._numerator, other._denominator
+        elif isinstance(other, int):
+            nb, db = other, 1
+        else:
+            return NotImplemented
+        na, da = self._numerator, self._denominator
+        if da == db:
+            return _lazy(na - nb, da)
+        return _lazy(na * db - nb * da, da * db)
+    
+    def __rsub__(self, other):
+        if isinstance(other, Fraction):
+            nb, db = other._numerator, other._denominator
+        elif isinstance(other, int):
+            nb, db = other, 1
+        else:
+            return NotImplemented
+        na, da = self._numerator, self._denominator
+        return _lazy(nb * da - na * db, da * db)
+    
+    def __mul__(self, other):
+        if isinstance(other, Fraction):
+            return _lazy(self._numerator * other._numerator,
+                         self._denominator * other._denominator)
+        if isinstance(other, int):
+            return _lazy(self._numerator * other, self._denominator)
+        return NotImplemented
+    
+    __rmul__ = __mul__
+    
+    def __truediv__(self, other):
+        if isinstance(other, Fraction):
+            nb, db = other._numerator, other._denominator
+        elif isinstance(other, int):
+            nb, db = other, 1
+        else:
+            return NotImplemented
+        if nb == 0:
+            raise ValueError("除数不能为零")
+        if nb < 0:
+            nb, db = -nb, -db
+        return _lazy(self._numerator * db, self._denominator * nb)
+    
+    def __rtruediv__(self, other):
+        if isinstance(other, Fraction):
+            nb, db = other._numerator, other._denominator
+        elif isinstance(other, int):
+            nb, db = other, 1
+        else:
+            return NotImplemented
+        na, da = self._numerator, self._denominator
+        if na == 0:
+            raise ValueError("除数不能为零")
+        if na < 0:
+            na, da = -na, -da
+        return _lazy(nb * da, db * na)
+    
+    def __eq__(self, other):
+        if isinstance(other, Fraction):
+            return self._numerator * other._denominator == other._numerator * self._denominator
+        if isinstance(other, int):
+            return self._numerator == other * self._denominator
+        return NotImplemented
+    
+    def __hash__(self):
+        self._normalize()
+        return Fraction.__hash__(self)
+
+
+def _lazy(numerator, denominator):
+    """由分母为正、未必约分的分子分母创建 LazyFraction"""
+    self = object.__new__(LazyFraction)
+    self._numerator = numerator
+    self._denominator = denominator
+    self._reduced = denominator == 1
+    return self
+
+
+class OperationCounter:
+    """统计 Fraction 运算次数的上下文管理器
+
+    进入时用计数包装替换 Fraction 的运算方法以及模块内的 gcd 和 _make
+    （每次 _make 对应一次分数结果的产生），退出时恢复原实现，
+    因此不统计时没有任何额外开销。不可嵌套使用。
+    """
+    
+    OPERATIONS = ('__add__', '__radd__', '__sub__', '__rsub__', '__mul__', '__rmul__',
+                  '__truediv__', '__rtruediv__', '__eq__', '__lt__', '__le__',
+                  '__gt__', '__ge__')
+    
+    def __init__(self):
+        self.counts = {}
+        self._saved = None
+    
+    def _wrap(self, name, func):
+        counts = self.counts
+        
+        def counted(*args):
+            counts[name] = counts.get(name, 0) + 1
+            return func(*args)
+        return counted
+    
+    def __enter__(self):
+        global gcd, _make
+        self._saved = ({name: Fraction.__dict__[name] for name in self.OPERATIONS},
+                       gcd, _make)
+        for name in self.OPERATIONS:
+            setattr(Fraction, name, self._wrap(name.strip('_'), Fraction.__dict__[name]))
+        gcd = self._wrap('gcd', gcd)
+        _make = self._wrap('make', _make)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        global gcd, _make
+        methods, gcd, _make = self._saved
+        for name, method in methods.items():
+            setattr(Fraction, name, method)
+        self._saved = None
+        return False
+
+
+# int64 运算的安全界：绝对值小于 2**31 时两两相乘再相加不会溢出
+_INT64_SAFE_LIMIT = 1 << 31
+_INT64_MAX = (1 << 63) - 1
+
+
+class FractionArray:
+    """基于 NumPy 的分数数组
+
+    分子分母分别保存在两个数组中，逐元素支持加减乘除和比较，
+    一次调用即可处理成千上万个分数。数值较小时使用 int64 运算，
+    可能溢出时自动改用 Python 整数（object 数组）计算。
+    """
+    
+    __slots__ = ('numerators', 'denominators')
+    
+    def __init__(self, numerators, denominators=None):
+        if np is None:
+            raise ImportError("FractionArray 需要安装 numpy")
+        
+        numerators = _as_integer_array(numerators)
+        if denominators is None:
+            denominators = np.ones(numerators.shape, dtype=numerators.dtype)
+        else:
+            denominators = _as_integer_array(denominators)
+        if numerators.shape != denominators.shape:
+            raise ValueError("分子与分母的长度不一致")
+        if (denominators == 0).any():
+            raise ValueError("分母不能为零")
+        
+        self.numerators, self.denominators = _normalize(numerators, denominators)
+    
+    @classmethod
+    def from_fractions(cls, fractions):
+        """由 Fraction 序列创建"""
+        fractions = list(fractions)
+        return cls([f.numerator for f in fractions], [f.denominator for f in fractions])
+    
+    @classmethod
+    def _from_reduced(cls, numerators, denominators):
+        """由已约分且分母为正的数组直接创建"""
+        self = object.__new__(cls)
+        self.numerators = numerators
+        self.denominators = denominators
+        return self
+    
+    def __len__(self):
+        return len(self.numerators)
+    
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Fraction(int(self.numerators[index]), int(self.denominators[index]))
+        return FractionArray._from_reduced(self.numerators[index], self.denominators[index])
+    
+    def __repr__(self):
+        return f"FractionArray({self.to_strings()})"
+    
+    def to_fractions(self):
+        """转换为 Fraction 列表"""
+        # 数组中的值已经约分，直接复用小整数和驻留的真分数
+        return [_make(n, d) for n, d in zip(self.numerators.tolist(),
+                                            self.denominators.tolist())]
+    
+    def to_strings(self):
+        """逐元素格式化，结果与 Fraction.to_string 相同"""
+        return [_format_fraction(n, d)
+                for n, d in zip(self.numerators.tolist(), self.denominators.tolist())]
+    
+    def is_proper(self):
+        """逐元素判断是否为真分数，返回布尔数组"""
+        return np.abs(self.numerators) < self.denominators
+    
+    def __add__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return FractionArray._from_normalized(na * db + nb * da, da * db)
+    
+    __radd__ = __add__
+    
+    def __sub__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return FractionArray._from_normalized(na * db - nb * da, da * db)
+    
+    def __rsub__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return FractionArray._from_normalized(nb * da - na * db, da * db)
+    
+    def __mul__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return FractionArray._from_normalized(na * nb, da * db)
+    
+    __rmul__ = __mul__
+    
+    def __truediv__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        if (nb == 0).any():
+            raise ValueError("除数不能为零")
+        return FractionArray._from_normalized(na * db, da * nb)
+    
+    def __rtruediv__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        if (na == 0).any():
+            raise ValueError("除数不能为零")
+        return FractionArray._from_normalized(nb * da, db * na)
+    
+    @classmethod
+    def _from_normalized(cls, numerators, denominators):
+        return cls._from_reduced(*_normalize(numerators, denominators))
+    
+    def __eq__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        # 双方都已约分，分子分母分别相等即相等
+        return (na == nb) & (da == db)
+    
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return ~result
+    
+    def __lt__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return na * db < nb * da
+    
+    def __le__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return na * db <= nb * da
+    
+    def __gt__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return na * db > nb * da
+    
+    def __ge__(self, other):
+        na, da, nb, db = _operands(self, other)
+        if na is None:
+            return NotImplemented
+        return na * db >= nb * da
+    
+    __hash__ = None
+
+
+def _as_integer_array(values):
+    """转换为一维整数数组，超出 int64 范围时使用 object 数组"""
+    array = np.asarray(values)
+    if array.dtype == object or array.dtype.kind not in 'iu':
+        array = np.array([int(value) for value in np.ravel(array)], dtype=object)
+        return _shrink(array)
+    return array.astype(np.int64, copy=False)
+
+
+def _fits(array, limit):
+    """数组中所有元素的绝对值是否都小于 limit"""
+    if len(array) == 0:
+        return True
+    return int(max(array.max(), -array.min())) < limit
+
+
+def _shrink(array):
+    """object 数组的值都在 int64 范围内时转换回 int64"""
+    if array.dtype == object and _fits(array, _INT64_MAX):
+        return array.astype(np.int64)
+    return array
+
+
+def _operands(left, right):
+    """取出两个操作数的分子分母，返回同为 int64 或同为 object 的四个数组
+
+    right 可以是 FractionArray、Fraction 或整数；不支持的类型返回四个 None。
+    任一数组可能使交叉相乘溢出 int64 时，全部改用 object 数组。
+    """
+    na, da = left.numerators, left.denominators
+    if isinstance(right, FractionArray):
+        nb, db = right.numerators, right.denominators
+    elif isinstance(right, Fraction):
+        nb, db = right.numerator, right.denominator
+    elif isinstance(right, int):
+        nb, db = right, 1
+    else:
+        return None, None, None, None
+    
+    if isinstance(nb, int):
+        dtype = na.dtype if abs(nb) < _INT64_SAFE_LIMIT and db < _INT64_SAFE_LIMIT else object
+        nb = np.full(na.shape, nb, dtype=dtype)
+        db = np.full(na.shape, db, dtype=dtype)
+    
+    arrays = (na, da, nb, db)
+    if all(a.dtype != object and _fits(a, _INT64_SAFE_LIMIT) for a in arrays):
+        return arrays
+    return tuple(a.astype(object) for a in arrays)
+
+
+def _normalize(numerators, denominators):
+    """分母转为正数并逐元素约分"""
+    negative = denominators < 0
+    if negative.any():
+        numerators = np.where(negative, -numerators, numerators)
+        denominators = np.where(negative, -denominators, denominators)
+    
+    gcd_values = np.gcd(numerators, denominators)
+    numerators = numerators // gcd_values
+    denominators = denominators // gcd_values
+    return _shrink(numerators), _shrink(denominators)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成统计模块
+记录题目生成过程中的尝试、拒绝原因、重复命中、各阶段耗时和分数运算次数
+"""
+
+import json
+
+
+# 拒绝原因
+NEGATIVE_SUBTRACTION = 'negative_subtraction'
+ZERO_DIVISOR = 'zero_divisor'
+IMPROPER_QUOTIENT = 'improper_quotient'
+NO_OPERAND = 'no_operand'
+ANSWER_RANGE = 'answer_range'
+OTHER = 'other'
+
+# 计时的阶段：构建表达式树、求值、规范化去重、格式化输出
+STAGES = ('build', 'evaluate', 'normalize', 'format')
+
+
+class GeneratorStats:
+    """题目生成的计数器与计时器
+
+    计数器总是开启；timing 为 True 时才记录各阶段耗时，
+    避免在不需要统计时为每次尝试多调用计时函数。
+    """
+
+    def __init__(self, timing=False):
+        self.timing = timing
+        self.attempts = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejections = {}
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self.fraction_operations = {}
+
+    def reject(self, reason, count=1):
+        """记录因违反约束而被丢弃的尝试"""
+        self.rejections[reason] = self.rejections.get(reason, 0) + count
+
+    def total_rejections(self):
+        return sum(self.rejections.values())
+
+    def rejection_rate(self):
+        """因违反约束而被丢弃的尝试所占比例"""
+        if self.attempts == 0:
+            return 0.0
+        return self.total_rejections() / self.attempts
+
+    def merge(self, other):
+        """合并另一份统计（如工作进程返回的统计）"""
+        self.attempts += other.attempts
+        self.accepted += other.accepted
+        self.duplicates += other.duplicates
+        for reason, count in other.rejections.items():
+            self.reject(reason, count)
+        for stage, seconds in other.timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        self.add_fraction_operations(other.fraction_operations)
+
+    def add_fraction_operations(self, counts):
+        for name, count in counts.items():
+            self.fraction_operations[name] = self.fraction_operations.get(name, 0) + count
+
+    def to_dict(self):
+        return {
+            'attempts': self.attempts,
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'rejections': dict(self.rejections),
+            'rejection_rate': self.rejection_rate(),
+            'timings': dict(self.timings) if self.timing else {},
+            'fraction_operations': dict(self.fraction_operations),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+
+    def format_report(self):
+        """格式化为便于阅读的文本报告"""
+        lines = [
+            f"尝试次数: {self.attempts}",
+            f"生成题目: {self.accepted}",
+            f"重复命中: {self.duplicates}",
+            f"约束拒绝: {self.total_rejections()} ({self.rejection_rate():.1%})",
+        ]
+        for reason, count in sorted(self.rejections.items()):
+            lines.append(f"  {reason}: {count}")
+        if self.timing:
+            lines.append("阶段耗时:")
+            for stage, seconds in self.timings.items():
+                lines.append(f"  {stage}: {seconds:.3f}s")
+        if self.fraction_operations:
+            lines.append("分数运算次数:")
+            for name, count in sorted(self.fraction_operations.items()):
+                lines.append(f"  {name}: {count}")
+        return '\n'.join(lines)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑表达式编码模块
+把表达式树编码为后缀（逆波兰）形式的短字节串：操作数用该数值范围操作数表中的
+序号表示，运算符用固定编码表示。求值、生成题目字符串和计算去重键都直接在
+编码上进行，大量题目可以保存在一块连续的 bytearray 中
+"""
+
+import hashlib
+import struct
+from array import array
+from fraction import Fraction
+from expression import KEY_DIGEST_SIZE
+from question_index import operand_values
+
+
+# 运算符编码为 0-3，操作数编码为 操作数序号 + len(OPERATORS)
+OPERATORS = ('+', '-', '×', '÷')
+_OPERATOR_CODES = {op: code for code, op in enumerate(OPERATORS)}
+
+
+class PostfixCodec:
+    """某个数值范围内表达式树与后缀编码之间的转换
+
+    每个记号的宽度由操作数表的大小决定（1、2 或 4 字节），
+    四个运算符的表达式最长 7 个记号。求值、括号和规范形式的规则取自生成器。
+    """
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.operands = operand_values(generator.max_value)
+        self._operand_ids = {value: index + len(OPERATORS)
+                             for index, value in enumerate(self.operands)}
+        token_count = len(self.operands) + len(OPERATORS)
+        if token_count <= 1 << 8:
+            self.typecode = 'B'
+        elif token_count <= 1 << 16:
+            self.typecode = 'H'
+        else:
+            self.typecode = 'I'
+        # 每个操作数的规范形式和题目字符串，按记号编码索引
+        self._forms = [None] * len(OPERATORS) + [
+            f"{value.numerator}/{value.denominator}" for value in self.operands]
+        self._texts = [None] * len(OPERATORS) + [
+            value.to_string() for value in self.operands]
+        # (子表达式运算符, 父运算符, 位置) -> 是否加括号
+        self._parentheses = {
+            (child, parent, position): generator._need_parentheses((child, None, None),
+                                                                   parent, position)
+            for child in OPERATORS for parent in OPERATORS
+            for position in ('left', 'right')}
+
+    def encode(self, tree):
+        """把表达式树编码为字节串，操作数超出数值范围时抛出 ValueError"""
+        tokens = array(self.typecode)
+        self._encode(tree, tokens)
+        return tokens.tobytes()
+
+    def decode(self, code):
+        """把编码还原为表达式树"""
+        stack = []
+        for token in self._tokens(code):
+            if token < len(OPERATORS):
+                right = stack.pop()
+                stack[-1] = (OPERATORS[token], stack[-1], right)
+            else:
+                stack.append(self.operands[token - len(OPERATORS)])
+        return stack[0]
+
+    def evaluate(self, code):
+        """计算编码表示的表达式，违反约束时抛出 ConstraintError"""
+        apply_operator = self.generator._apply_operator
+        operands = self.operands
+        stack = []
+        for token in self._tokens(code):
+            if token < len(OPERATORS):
+                right = stack.pop()
+                stack[-1] = apply_operator(OPERATORS[token], stack[-1], right)
+            else:
+                stack.append(operands[token - len(OPERATORS)])
+        return stack[0]
+
+    def render(self, code):
+        """生成与 ExpressionGenerator._tree_to_string 相同的题目字符串"""
+        parentheses = self._parentheses
+        texts = self._texts
+        # 栈中保存 (字符串, 顶层运算符或 None)
+        stack = []
+        for token in self._tokens(code):
+            if token < len(OPERATORS):
+                op = OPERATORS[token]
+                right_str, right_op = stack.pop()
+                left_str, left_op = stack[-1]
+                if left_op is not None and parentheses[left_op, op, 'left']:
+                    left_str = f"({left_str})"
+                if right_op is not None and parentheses[right_op, op, 'right']:
+                    right_str = f"({right_str})"
+                stack[-1] = (f"{left_str} {op} {right_str}", op)
+            else:
+                stack.append((texts[token], None))
+        return stack[0][0]
+
+    def canonical_key(self, code):
+        """与 ExpressionGenerator._canonical_key 相同的去重键"""
+        is_commutative = self.generator._is_commutative
+        forms = self._forms
+        stack = []
+        for token in self._tokens(code):
+            if token < len(OPERATORS):
+                op = OPERATORS[token]
+                right_form = stack.pop()
+                left_form = stack[-1]
+                if is_commutative(op) and right_form < left_form:
+                    left_form, right_form = right_form, left_form
+                stack[-1] = f"({left_form}{op}{right_form})"
+            else:
+                stack.append(forms[token])
+        return hashlib.blake2b(stack[0].encode('utf-8'),
+                               digest_size=KEY_DIGEST_SIZE).digest()
+
+    def _tokens(self, code):
+        return memoryview(code).cast(self.typecode)
+
+    def _encode(self, tree, tokens):
+        if isinstance(tree, Fraction):
+            token = self._operand_ids.get(tree)
+            if token is None:
+                raise ValueError(f"操作数 {tree.to_string()} 超出数值范围 {self.generator.max_value}")
+            tokens.append(token)
+            return
+        op, left, right = tree
+        self._encode(left, tokens)
+        self._encode(right, tokens)
+        tokens.append(_OPERATOR_CODES[op])
+
+
+class ExpressionStore:
+    """按顺序保存大量编码后的表达式
+
+    所有编码首尾相接保存在一个 bytearray 中，另用一个 array 记录每个编码的
+    结束偏移，每道题只占编码本身的几个字节加 4 字节偏移（-r 10 时平均约 9 字节，
+    -r 100 时约 13 字节，一千万道题约 90-130MB）。编码数据总量不能超过 4GB。
+    穷举索引（question_index.QuestionIndex）用它保存全部题目。
+    """
+
+    def __init__(self, codec):
+        self.codec = codec
+        self._data = bytearray()
+        self._offsets = array('I', [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        """第 index 个表达式的编码"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("表达式序号超出范围")
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def nbytes(self):
+        """编码数据和偏移表占用的字节数"""
+        return len(self._data) + self._offsets.itemsize * len(self._offsets)
+
+    def append(self, tree):
+        """编码并追加一个表达式树"""
+        self.append_code(self.codec.encode(tree))
+
+    def append_code(self, code):
+        """追加一个已编码的表达式"""
+        self._data += code
+        self._offsets.append(len(self._data))
+
+    def write(self, f):
+        """把偏移表和编码数据写入二进制文件 f（本机字节序，只用于本机缓存）"""
+        f.write(struct.pack('<QQ', len(self._offsets), len(self._data)))
+        f.write(self._offsets.tobytes())
+        f.write(self._data)
+
+    @classmethod
+    def read(cls, codec, f):
+        """读取 write 写入的数据，内容不完整时抛出 ValueError"""
+        header = f.read(struct.calcsize('<QQ'))
+        if len(header) != struct.calcsize('<QQ'):
+            raise ValueError("编码数据不完整")
+        offset_count, data_size = struct.unpack('<QQ', header)
+        store = cls(codec)
+        offsets = f.read(offset_count * store._offsets.itemsize)
+        data = f.read(data_size)
+        if (len(offsets) != offset_count * store._offsets.itemsize
+                or len(data) != data_size):
+            raise ValueError("编码数据不完整")
+        store._offsets = array('I')
+        store._offsets.frombytes(offsets)
+        if not store._offsets or store._offsets[0] != 0 or store._offsets[-1] != data_size:
+            raise ValueError("编码数据的偏移表与数据长度不符")
+        store._data = bytearray(data)
+        return store
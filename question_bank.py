@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题库模块
+基于 SQLite 的本地题库，跨多次运行去重，并可按条件直接取出已保存的题目
+"""
+
+import sqlite3
+
+
+# 单条 SQL 中 IN (...) 的最大参数个数，低于 SQLite 的默认上限
+_QUERY_CHUNK_SIZE = 500
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS questions (
+    key BLOB PRIMARY KEY,
+    exercise TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    operator_count INTEGER NOT NULL,
+    max_value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_questions_range
+    ON questions (max_value, operator_count);
+'''
+
+
+def count_operators(exercise):
+    """统计题目中的运算符个数（题目中不会出现负数，'-' 只表示减号）"""
+    return sum(exercise.count(op) for op in ('+', '-', '×', '÷'))
+
+
+class QuestionBank:
+    """保存在本地文件中的题库
+
+    以题目规范形式的去重键为主键，保存题目、答案、运算符个数和数值范围。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+
+    def existing_keys(self, keys):
+        """批量查询，返回 keys 中已在题库里的去重键集合"""
+        keys = list(keys)
+        existing = set()
+        for start in range(0, len(keys), _QUERY_CHUNK_SIZE):
+            chunk = keys[start:start + _QUERY_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.connection.execute(
+                f'SELECT key FROM questions WHERE key IN ({placeholders})', chunk)
+            existing.update(row[0] for row in rows)
+        return existing
+
+    def keys(self, max_value):
+        """某个数值范围内已保存的全部去重键"""
+        rows = self.connection.execute(
+            'SELECT key FROM questions WHERE max_value = ?', (max_value,))
+        return {row[0] for row in rows}
+
+    def add(self, records, max_value):
+        """在一个事务中批量保存 (去重键, 题目, 答案) 记录，已存在的键被忽略"""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO questions '
+                '(key, exercise, answer, operator_count, max_value) VALUES (?, ?, ?, ?, ?)',
+                ((key, exercise, answer, count_operators(exercise), max_value)
+                 for key, exercise, answer in records))
+
+    def fetch(self, count, max_value=None, operator_count=None):
+        """按条件随机取出至多 count 道已保存的题目，返回 (题目, 答案) 列表"""
+        conditions = []
+        params = []
+        if max_value is not None:
+            conditions.append('max_value = ?')
+            params.append(max_value)
+        if operator_count is not None:
+            conditions.append('operator_count = ?')
+            params.append(operator_count)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self.connection.execute(
+            f'SELECT exercise, answer FROM questions {where} ORDER BY RANDOM() LIMIT ?',
+            params + [count])
+        return rows.fetchall()
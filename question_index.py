@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题目索引模块
+数值范围较小时穷举所有不重复的合法题目，缓存到磁盘，并从中无放回抽样
+"""
+
+import contextlib
+import gzip
+import os
+import random
+from fraction import Fraction
+from expression import KEY_DIGEST_SIZE
+
+
+# 穷举的原始表达式数量上限（约对应 -r 4），超过时仍使用随机生成
+INDEX_SPACE_LIMIT = 1000000
+
+# 用户缓存目录下存放索引缓存的子目录
+CACHE_SUBDIR = os.path.join('arithmetic_generator', 'question_index')
+
+# 缓存文件格式版本，表达式格式或去重规则变化时递增
+INDEX_VERSION = 2
+
+
+def default_cache_dir():
+    """索引缓存目录：$XDG_CACHE_HOME（未设置时为 ~/.cache）下的固定子目录，
+    与运行时的工作目录和程序的安装位置无关"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, CACHE_SUBDIR)
+
+
+def operand_values(max_value):
+    """Fraction.random_number 可能产生的所有操作数（按值去重）"""
+    values = [Fraction(value, 1) for value in range(max_value)]
+    seen = set()
+    for denominator in range(2, max_value + 1):
+        for numerator in range(1, denominator):
+            value = Fraction(numerator, denominator)
+            if value not in seen:
+                seen.add(value)
+                values.append(value)
+    return values
+
+
+def operand_count(max_value):
+    """operand_values(max_value) 的长度，不必构造各个操作数
+
+    max_value 个整数，加上分母为 d 的 φ(d) 个最简真分数（d = 2 .. max_value）。
+    """
+    phi = list(range(max_value + 1))
+    for p in range(2, max_value + 1):
+        if phi[p] == p:
+            for multiple in range(p, max_value + 1, p):
+                phi[multiple] -= phi[multiple] // p
+    return max_value + sum(phi[2:])
+
+
+def estimate_space(max_value, operator_count=4):
+    """穷举时需要检查的原始表达式数量
+
+    形状与 ExpressionGenerator 一致：a∘b、(a∘b)∘c、((a∘b)∘c)∘d、(a∘b)∘(c∘d)。
+    """
+    return _space(operand_count(max_value), operator_count)
+
+
+def fits_index(max_value, operator_count=4):
+    """默认是否使用穷举索引（原始表达式数量不超过 INDEX_SPACE_LIMIT）"""
+    # 操作数至少有 max_value 个，数值范围较大时直接判断，不必计算操作数个数
+    if _space(max_value, operator_count) > INDEX_SPACE_LIMIT:
+        return False
+    return estimate_space(max_value, operator_count) <= INDEX_SPACE_LIMIT
+
+
+def _space(n, ops):
+    return ops * n ** 2 + ops ** 2 * n ** 3 + 2 * ops ** 3 * n ** 4
+
+
+class QuestionIndex:
+    """某个数值范围内全部不重复的合法题目
+
+    题目以紧凑后缀编码保存在 postfix_expression.ExpressionStore 中，去重键
+    （与 ExpressionGenerator 相同）首尾相接保存在一个 bytes 中；题目字符串和
+    答案在取用时才由编码生成。-r 4 时约 19 万道题只占几 MB。
+    """
+
+    def __init__(self, store, keys):
+        self.store = store
+        self.max_value = store.codec.generator.max_value
+        self._keys = keys
+
+    @property
+    def capacity(self):
+        """不重复题目的总数"""
+        return len(self.store)
+
+    def keys(self):
+        """按顺序产出每道题的去重键"""
+        keys = self._keys
+        for start in range(0, len(keys), KEY_DIGEST_SIZE):
+            yield keys[start:start + KEY_DIGEST_SIZE]
+
+    def record(self, position):
+        """第 position 道题，返回 (去重键, 题目, 答案)"""
+        code = self.store[position]
+        codec = self.store.codec
+        start = position * KEY_DIGEST_SIZE
+        return (self._keys[start:start + KEY_DIGEST_SIZE], codec.render(code),
+                codec.evaluate(code).to_string())
+
+    def sample(self, count, exclude=()):
+        """无放回随机抽取 count 道题，跳过去重键在 exclude 中的题目"""
+        positions = range(self.capacity)
+        if exclude:
+            positions = [position for position, key in enumerate(self.keys())
+                         if key not in exclude]
+        if count > len(positions):
+            raise ValueError(f"数值范围 {self.max_value} 内最多只能生成 "
+                             f"{self.capacity} 道不重复的题目，剩余 {len(positions)} 道，"
+                             f"无法生成 {count} 道")
+        return [self.record(position) for position in random.sample(positions, count)]
+
+    @classmethod
+    def build(cls, generator):
+        """按生成器的数值范围、形状和去重规则穷举全部题目"""
+        from postfix_expression import ExpressionStore, PostfixCodec
+
+        store = ExpressionStore(PostfixCodec(generator))
+        seen = set()
+        keys = bytearray()
+
+        def add(tree):
+            key = generator._canonical_key(tree)
+            if key not in seen:
+                seen.add(key)
+                keys.extend(key)
+                store.append(tree)
+
+        operands = store.codec.operands
+
+        # 自底向上组合，违反约束的子表达式在组合前就被剪掉
+        def combine(lefts, rights):
+            combined = []
+            for left, left_val in lefts:
+                for right, right_val in rights:
+                    for op in generator.operators:
+                        try:
+                            value = generator._apply_operator(op, left_val, right_val)
+                        except ValueError:
+                            continue
+                        combined.append(((op, left, right), value))
+            return combined
+
+        leaves = [(value, value) for value in operands]
+        one = combine(leaves, leaves)
+        two = combine(one, leaves)
+        three = combine(two, leaves) + combine(one, one)
+
+        for tree, _ in one + two + three:
+            add(tree)
+        return cls(store, bytes(keys))
+
+    @classmethod
+    def load_or_build(cls, generator, cache_dir=None):
+        """从磁盘缓存读取索引，不存在时穷举并写入缓存
+
+        cache_dir 默认为 default_cache_dir()。缓存无法读取时重新穷举，
+        无法写入（如目录只读）时只在内存中使用穷举结果。
+        """
+        from postfix_expression import ExpressionStore, PostfixCodec
+
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        path = os.path.join(cache_dir, f'r{generator.max_value}.v{INDEX_VERSION}.bin.gz')
+        if os.path.exists(path):
+            try:
+                with gzip.open(path, 'rb') as f:
+                    store = ExpressionStore.read(PostfixCodec(generator), f)
+                    keys = f.read()
+                if len(keys) != len(store) * KEY_DIGEST_SIZE:
+                    raise ValueError("去重键数量与题目数量不符")
+                return cls(store, keys)
+            except (OSError, EOFError, ValueError):
+                pass
+
+        index = cls.build(generator)
+        # 先写临时文件再改名，避免并发或中断时留下不完整的缓存
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with gzip.open(tmp_path, 'wb') as f:
+                index.store.write(f)
+                f.write(index._keys)
+            os.replace(tmp_path, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+        return index
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题目集模块
+把题目和答案写入文件，同时在题目文件旁写一个保存各题去重键的索引文件，
+之后追加新题目时直接读取索引去重并接着编号，不必重新解析题目文本
+"""
+
+import codecs
+import contextlib
+import os
+import struct
+from expression_parser import parse_expression
+from expression import KEY_DIGEST_SIZE
+from validator import _iter_numbered_buffer, _EXERCISE_BUFFER_PATTERN
+
+
+# 索引文件名为题目文件名加上该后缀
+SIDECAR_SUFFIX = '.keys'
+
+# 索引文件头：魔数与格式版本、写入时题目文件的字节数；其后为各题的去重键
+_MAGIC = b'QKEYS\x00\x00\x01'
+_HEADER = struct.Struct('<8sQ')
+
+# 输出文件的写缓冲大小
+WRITE_BUFFER_SIZE = 1 << 16
+
+# 查找最后一个题号时先从文件末尾读取的字节数，找不到时加倍
+TAIL_READ_SIZE = 1 << 12
+
+
+def sidecar_path(exercise_file):
+    return exercise_file + SIDECAR_SUFFIX
+
+
+def write_questions(records, exercise_file, answer_file, start=1, keys=True):
+    """将 (去重键, 题目, 答案) 流式写入新的题目文件和答案文件，返回题目数
+
+    题号从 start 开始。keys 为 True 时同时写索引文件；
+    为 False 时（如从题库取题、分页模式）去重键可以为 None，不写索引并删除
+    旧的索引文件，之后追加时会解析题目文件重建索引。
+    """
+    if not keys:
+        remove_sidecar(exercise_file)
+    with open(exercise_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as ef, \
+            open(answer_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as af, \
+            (open(sidecar_path(exercise_file), 'wb', buffering=WRITE_BUFFER_SIZE) if keys
+             else contextlib.nullcontext()) as kf:
+        if kf is None:
+            return _write_records(records, ef, af, None, start)
+        kf.write(_HEADER.pack(_MAGIC, 0))
+        count = _write_records(records, ef, af, kf, start)
+        ef.flush()
+        kf.seek(0)
+        kf.write(_HEADER.pack(_MAGIC, os.fstat(ef.fileno()).st_size))
+    return count
+
+
+def append_questions(records, exercise_file, answer_file):
+    """把 (去重键, 题目, 答案) 追加到已有的题目文件和答案文件，题号接着已有的题目编号
+
+    题号从题目文件中最后一个题号之后开始（分页生成的文件不从 1 开始编号）。
+    三个文件要么全部追加成功，要么（出错或被中断时）全部截断回追加前的状态。
+    返回追加的题目数。
+    """
+    keys_file = sidecar_path(exercise_file)
+    sizes = [os.path.getsize(path) for path in (exercise_file, answer_file, keys_file)]
+    start = next_number(exercise_file)
+
+    files = [open(exercise_file, 'a', encoding='utf-8', buffering=WRITE_BUFFER_SIZE),
+             open(answer_file, 'a', encoding='utf-8', buffering=WRITE_BUFFER_SIZE),
+             open(keys_file, 'r+b')]
+    ef, af, kf = files
+    try:
+        kf.seek(0, os.SEEK_END)
+        count = _write_records(records, ef, af, kf, start)
+        for f in files:
+            f.flush()
+        # 最后更新索引头中的题目文件大小，索引才被视为与题目文件一致
+        kf.seek(0)
+        kf.write(_HEADER.pack(_MAGIC, os.fstat(ef.fileno()).st_size))
+        kf.flush()
+    except BaseException:
+        for f, size in zip(files, sizes):
+            f.truncate(size)
+        kf.seek(0)
+        kf.write(_HEADER.pack(_MAGIC, sizes[0]))
+        raise
+    finally:
+        for f in files:
+            f.close()
+    return count
+
+
+def next_number(exercise_file):
+    """题目文件中最后一个题号加 1，没有题目时为 1
+
+    只读取文件末尾，从末尾读取的范围内没有完整的题目行时加倍再读。
+    """
+    size = os.path.getsize(exercise_file)
+    read_size = TAIL_READ_SIZE
+    with open(exercise_file, 'rb') as f:
+        while True:
+            offset = max(size - read_size, 0)
+            f.seek(offset)
+            tail = f.read()
+            if offset > 0:
+                # 第一行可能不完整
+                tail = tail[tail.find(b'\n') + 1:] if b'\n' in tail else b''
+            elif tail.startswith(codecs.BOM_UTF8):
+                tail = tail[len(codecs.BOM_UTF8):]
+            matches = _EXERCISE_BUFFER_PATTERN.findall(tail)
+            if matches:
+                return int(matches[-1][0]) + 1
+            if offset == 0:
+                return 1
+            read_size *= 2
+
+
+def remove_sidecar(exercise_file):
+    """删除索引文件（题目文件被不带去重键的内容覆盖时调用）"""
+    if os.path.exists(sidecar_path(exercise_file)):
+        os.remove(sidecar_path(exercise_file))
+
+
+def load_keys(exercise_file, generator):
+    """读取题目文件对应的去重键列表
+
+    索引文件缺失或与题目文件不一致（如题目文件被修改过）时，
+    解析题目文件重建索引。
+    """
+    keys_file = sidecar_path(exercise_file)
+    if os.path.exists(keys_file):
+        with open(keys_file, 'rb') as f:
+            data = f.read()
+        if len(data) >= _HEADER.size:
+            magic, exercise_size = _HEADER.unpack_from(data)
+            if magic == _MAGIC and exercise_size == os.path.getsize(exercise_file) \
+                    and (len(data) - _HEADER.size) % KEY_DIGEST_SIZE == 0:
+                return [data[offset:offset + KEY_DIGEST_SIZE]
+                        for offset in range(_HEADER.size, len(data), KEY_DIGEST_SIZE)]
+    return rebuild_keys(exercise_file, generator)
+
+
+def rebuild_keys(exercise_file, generator):
+    """解析题目文件，重新计算各题的去重键并写入索引文件"""
+    keys = [generator._canonical_key(parse_expression(exercise))
+            for _, exercise in _iter_numbered_buffer(exercise_file, _EXERCISE_BUFFER_PATTERN)]
+    with open(sidecar_path(exercise_file), 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, os.path.getsize(exercise_file)))
+        f.write(b''.join(keys))
+    return keys
+
+
+def _write_records(records, ef, af, kf, start):
+    """按题号写出各题，kf 为 None 时不写去重键"""
+    count = 0
+    for number, (key, exercise, answer) in enumerate(records, start):
+        ef.write(f"{number}. {exercise} = \n")
+        af.write(f"{number}. {answer}\n")
+        if kf is not None:
+            kf.write(key)
+        count += 1
+    return count
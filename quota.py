@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配额生成模块
+按规格精确控制题目的组成：运算符个数、包含哪些运算符、是否含分数、是否有括号
+和答案范围各占多少比例。每道题先按各项的剩余配额挑选运算符、表达式形状和
+操作数类型，再生成题目，而不是生成后再筛选
+"""
+
+import itertools
+import json
+import random
+from fraction import Fraction
+from batch_evaluator import SHAPES, _fill_operators
+from expression import ConstraintError
+import generator_stats
+
+
+# 同一组选择（模板、是否含分数、答案是否在范围内）下重新挑选操作数的次数，
+# 超过后重新做选择
+ATTEMPTS_PER_CHOICE = 100
+
+# 每道题最多的尝试次数，超过时认为规格无法满足
+MAX_ATTEMPTS_PER_QUESTION = 10000
+
+# 规格文件中运算符的写法
+OPERATOR_ALIASES = {'+': '+', '-': '-', '×': '×', '*': '×', 'x': '×', '÷': '÷', '/': '÷'}
+
+
+class QuotaSpec:
+    """题目组成的规格
+
+    operator_counts 为 {运算符个数: 比例}，未列出的个数平分剩余的比例；
+    operators 为 {运算符: 含该运算符的题目比例}；fractions 为操作数中含真分数的
+    题目比例；parentheses 为含括号的题目比例；answer_range 为 (下限, 上限, 比例)，
+    即答案在 [下限, 上限] 内的题目比例。比例按题目数四舍五入为精确的题数，
+    其余题目都不具有该特征；未给出的项不加限制。
+    """
+
+    def __init__(self, operator_counts=None, operators=None, fractions=None,
+                 parentheses=None, answer_range=None):
+        self.operator_counts = {int(count): _share(share, f"{count} 个运算符")
+                                for count, share in (operator_counts or {}).items()}
+        if not set(self.operator_counts) <= set(SHAPES):
+            raise ValueError("运算符个数只能为 1、2 或 3")
+        total = sum(self.operator_counts.values())
+        if total > 1 + 1e-9 or (len(self.operator_counts) == len(SHAPES)
+                                and abs(total - 1) > 1e-9):
+            raise ValueError("各运算符个数的比例之和必须为 1")
+
+        self.operators = {}
+        for op, share in (operators or {}).items():
+            if op not in OPERATOR_ALIASES:
+                raise ValueError(f"未知的运算符: {op}")
+            self.operators[OPERATOR_ALIASES[op]] = _share(share, f"运算符 {op}")
+        self.fractions = None if fractions is None else _share(fractions, "含分数")
+        self.parentheses = None if parentheses is None else _share(parentheses, "含括号")
+
+        self.answer_range = None
+        if answer_range is not None:
+            lower, upper, share = answer_range
+            lower, upper = _number(lower), _number(upper)
+            if upper < lower:
+                raise ValueError("答案范围的下限不能大于上限")
+            self.answer_range = (lower, upper, _share(share, "答案范围"))
+
+    @classmethod
+    def from_dict(cls, data):
+        """由字典创建，格式与规格文件相同：
+
+        {"operator_counts": {"3": 0.4}, "operators": {"÷": 0.2},
+         "fractions": 0.3, "parentheses": 0.25,
+         "answer_range": {"min": 0, "max": 10, "share": 0.5}}
+        """
+        answer_range = data.get('answer_range')
+        if answer_range is not None:
+            answer_range = (answer_range.get('min', 0), answer_range['max'],
+                            answer_range.get('share', 1))
+        return cls(operator_counts=data.get('operator_counts'),
+                   operators=data.get('operators'),
+                   fractions=data.get('fractions'),
+                   parentheses=data.get('parentheses'),
+                   answer_range=answer_range)
+
+    @classmethod
+    def load(cls, path):
+        """读取 JSON 格式的规格文件"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def quotas(self, count):
+        """把比例换算为 count 道题中的精确题数
+
+        返回 (各运算符个数的题数, {特征: 题数})，特征为 ('operator', 运算符)、
+        'fractions'、'parentheses' 或 'answer'。
+        """
+        shares = dict(self.operator_counts)
+        unspecified = [c for c in SHAPES if c not in shares]
+        for c in unspecified:
+            shares[c] = (1 - sum(self.operator_counts.values())) / len(unspecified)
+        operator_counts = _largest_remainder(count, shares)
+
+        features = {('operator', op): share for op, share in self.operators.items()}
+        if self.fractions is not None:
+            features['fractions'] = self.fractions
+        if self.parentheses is not None:
+            features['parentheses'] = self.parentheses
+        if self.answer_range is not None:
+            features['answer'] = self.answer_range[2]
+        return operator_counts, {feature: int(share * count + 0.5)
+                                 for feature, share in features.items()}
+
+
+class QuotaSampler:
+    """按 QuotaSpec 生成题目
+
+    运算符个数、包含哪些运算符和是否有括号都由模板（形状与运算符）决定。
+    开始生成前先规划各类模板（按这几项特征分类）各出多少道题，使这几项恰好
+    达到配额；之后每道题按各类的剩余题数抽取一类，并在类中优先选择容易成功的模板。
+    是否含分数、答案是否在范围内与模板无关，按剩余配额逐题抽取：配额等于剩余
+    题数时必须选中，为 0 时必须避开，因此结束时也恰好达到配额。
+    约束检查、去重和统计都使用生成器的实现。
+    """
+
+    def __init__(self, generator, spec):
+        self.generator = generator
+        self.spec = spec
+        # [(运算符个数, 模板, 该运算符个数下随机选中的概率, 包含的运算符, 是否有括号)]
+        self._templates = []
+        for operator_count, shapes in SHAPES.items():
+            operator_tuples = list(itertools.product(generator.operators, repeat=operator_count))
+            for shape, shape_weight in shapes:
+                for ops in operator_tuples:
+                    skeleton = _fill_operators(shape, ops)
+                    self._templates.append((operator_count, skeleton,
+                                            shape_weight / len(operator_tuples),
+                                            frozenset(ops), self._has_parentheses(skeleton)))
+        # 类别 -> 模板序号列表，类别为 (运算符个数, 有配额的运算符中包含哪些, 是否有括号)
+        self._groups = {}
+        for index, (operator_count, _, _, ops, parentheses) in enumerate(self._templates):
+            group = (operator_count, ops.intersection(spec.operators),
+                     parentheses if spec.parentheses is not None else None)
+            self._groups.setdefault(group, []).append(index)
+        # (类别或模板序号, 是否含分数, 答案是否在范围内) -> [成功次数, 尝试次数]
+        self._outcomes = {}
+        self._template_outcomes = {}
+
+    def iter_records(self, count):
+        """逐个生成题目，产出 (去重键, 题目, 答案)
+
+        规格无法满足（各项配额相互矛盾，或尝试次数超过上限）时抛出 ValueError。
+        """
+        operator_counts, remaining = self.spec.quotas(count)
+        if remaining.get('fractions') and self.generator.max_value < 2:
+            raise ValueError("数值范围小于 2 时没有真分数")
+        plan = self._plan(operator_counts, remaining)
+
+        records = []
+        for left in range(count, 0, -1):
+            group, fractions, in_range, record = self._generate_one(plan, remaining, left)
+            plan[group] -= 1
+            if plan[group] == 0:
+                del plan[group]
+            if fractions:
+                remaining['fractions'] -= 1
+            if in_range:
+                remaining['answer'] -= 1
+            records.append(record)
+        # 按类别顺序生成，最后打乱题目顺序
+        random.shuffle(records)
+        yield from records
+
+    def _plan(self, operator_counts, remaining):
+        """规划各类模板的题数，使运算符个数、各运算符和括号的题数恰好达到配额
+
+        先在每个运算符个数内按模板被随机选中的概率分配，再反复把若干道题从一类
+        挪到同一运算符个数的另一类，每次选择使总偏差下降最多的挪法。
+        """
+        targets = {feature: n for feature, n in remaining.items()
+                   if feature not in ('fractions', 'answer')}
+        features = {group: {('operator', op) for op in group[1]} |
+                    ({'parentheses'} if group[2] else set())
+                    for group in self._groups}
+        by_count = {}
+        for group in self._groups:
+            by_count.setdefault(group[0], []).append(group)
+
+        plan = {}
+        for operator_count, count in operator_counts.items():
+            plan.update(_largest_remainder(count, {
+                group: sum(self._templates[index][2] for index in self._groups[group])
+                for group in by_count[operator_count]}))
+
+        while True:
+            errors = {feature: sum(n for group, n in plan.items() if feature in features[group])
+                      - target for feature, target in targets.items()}
+            if not any(errors.values()):
+                return {group: n for group, n in plan.items() if n}
+
+            best = None
+            for source, available in plan.items():
+                if available == 0:
+                    continue
+                for destination in by_count[source[0]]:
+                    gain = 0
+                    amount = available
+                    for feature, error in errors.items():
+                        delta = (feature in features[destination]) - (feature in features[source])
+                        if delta * error < 0:
+                            gain += 1
+                            amount = min(amount, abs(error))
+                        elif delta:
+                            gain -= 1
+                    if gain > 0 and (best is None or gain > best[0]):
+                        best = (gain, source, destination, amount)
+            if best is None:
+                raise ValueError("规格中的配额相互矛盾，例如运算符个数、运算符和括号的比例无法同时满足")
+            _, source, destination, amount = best
+            plan[source] -= amount
+            plan[destination] += amount
+
+    def _generate_one(self, plan, remaining, left):
+        """生成一道题，返回 (类别, 是否含分数, 答案是否在范围内, 记录)"""
+        attempts = 0
+        while attempts < MAX_ATTEMPTS_PER_QUESTION:
+            group, fractions, in_range = self._choose(plan, remaining, left)
+            outcome = self._outcomes.setdefault((group, fractions, in_range), [0, 0])
+            for _ in range(ATTEMPTS_PER_CHOICE):
+                attempts += 1
+                outcome[1] += 1
+                record = self._attempt(group, fractions, in_range)
+                if record is not None:
+                    outcome[0] += 1
+                    return group, fractions, in_range, record
+        raise ValueError(f"尝试 {MAX_ATTEMPTS_PER_QUESTION} 次仍无法生成满足规格的题目，"
+                         f"请放宽规格或增大数值范围")
+
+    def _choose(self, plan, remaining, left):
+        """按剩余配额和估计的成功率挑选 (类别, 是否含分数, 答案是否在范围内)
+
+        类别按剩余题数抽取；是否含分数、答案是否在范围内按剩余配额抽取，
+        配额等于剩余题数时必须选中，为 0 时必须避开。成功率按
+        (成功次数 + 1) / (尝试次数 + 2) 估计，难以满足的组合（如答案必须大于 1
+        的一位除法）会越来越少被选中，在配额还有余地时就避开它们。
+        """
+        # 不重复的题目越少的类别越先生成，此时两项特征的配额还有余地
+        operator_count = min(group[0] for group in plan)
+        groups = [group for group in plan if group[0] == operator_count]
+        group = random.choices(groups, [plan[group] for group in groups])[0]
+        flags = [self._flag_choices(remaining, feature, left)
+                 for feature in ('fractions', 'answer')]
+        choices = []
+        weights = []
+        for fractions, fractions_probability in flags[0]:
+            for in_range, range_probability in flags[1]:
+                weight = fractions_probability * range_probability
+                if weight > 0:
+                    successes, attempts = self._outcomes.get((group, fractions, in_range), (0, 0))
+                    choices.append((group, fractions, in_range))
+                    weights.append(weight * (successes + 1) / (attempts + 2))
+        return random.choices(choices, weights)[0]
+
+    def _attempt(self, group, fractions, in_range):
+        """在该类中挑选模板和操作数生成一次，不满足约束、答案范围或重复时返回 None"""
+        generator = self.generator
+        stats = generator.stats
+        stats.attempts += 1
+        index = self._choose_template(self._groups[group], fractions, in_range)
+        outcome = self._template_outcomes.setdefault((index, fractions, in_range), [0, 0])
+        outcome[1] += 1
+        operator_count, skeleton = self._templates[index][:2]
+        tree = _instantiate(skeleton, self._operands(operator_count + 1, fractions))
+        try:
+            result = generator._evaluate_expression_tree(tree)
+        except ConstraintError as e:
+            stats.reject(e.reason)
+            return None
+        if in_range is not None and self._in_range(result) != in_range:
+            stats.reject(generator_stats.ANSWER_RANGE)
+            return None
+        record = generator._accept(tree, result)
+        if record is not None:
+            outcome[0] += 1
+        return record
+
+    def _choose_template(self, indices, fractions, in_range):
+        """在一类模板中按被随机选中的概率和估计的成功率挑选一个
+
+        成功率按 (成功次数 + 1) / (尝试次数 + 2) 估计，约束或答案范围很难满足、
+        不重复的题目已被用完的模板会越来越少被选中。
+        """
+        weights = []
+        for index in indices:
+            successes, attempts = self._template_outcomes.get((index, fractions, in_range),
+                                                              (0, 0))
+            weights.append(self._templates[index][2] * (successes + 1) / (attempts + 2))
+        return random.choices(indices, weights)[0]
+
+    def _flag_choices(self, remaining, feature, left):
+        """某个与模板无关的特征的可选取值及其概率，未限制时只有 None"""
+        if feature not in remaining:
+            return [(None, 1.0)]
+        probability = remaining[feature] / left
+        return [(True, probability), (False, 1.0 - probability)]
+
+    def _operands(self, count, fractions):
+        """挑选操作数：fractions 为 True 时至少有一个真分数，为 False 时全为整数"""
+        max_value = self.generator.max_value
+        if fractions is False:
+            return [Fraction(random.randint(0, max_value - 1), 1) for _ in range(count)]
+        operands = [Fraction.random_number(max_value) for _ in range(count)]
+        if fractions and all(operand.denominator == 1 for operand in operands):
+            operands[random.randrange(count)] = Fraction.random_fraction(max_value)
+        return operands
+
+    def _in_range(self, value):
+        lower, upper, _ = self.spec.answer_range
+        return lower <= value <= upper
+
+    def _has_parentheses(self, skeleton):
+        """模板对应的题目字符串中是否有括号（只取决于形状和运算符）"""
+        if not isinstance(skeleton, tuple):
+            return False
+        op, left, right = skeleton
+        need_parentheses = self.generator._need_parentheses
+        return (need_parentheses(left, op, 'left') or need_parentheses(right, op, 'right')
+                or self._has_parentheses(left) or self._has_parentheses(right))
+
+
+def _instantiate(skeleton, operands):
+    """用操作数替换模板中的操作数序号，得到表达式树"""
+    if isinstance(skeleton, int):
+        return operands[skeleton]
+    op, left, right = skeleton
+    return (op, _instantiate(left, operands), _instantiate(right, operands))
+
+
+def _largest_remainder(count, shares):
+    """按比例把 count 分给各项，总数恰好为 count（最大余数法）"""
+    exact = {key: share * count for key, share in shares.items()}
+    counts = {key: int(value) for key, value in exact.items()}
+    order = sorted(exact, key=lambda key: exact[key] - counts[key], reverse=True)
+    for key in order[:count - sum(counts.values())]:
+        counts[key] += 1
+    return counts
+
+
+def _share(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+        raise ValueError(f"{name} 的比例必须在 0 和 1 之间")
+    return value
+
+
+def _number(value):
+    """答案范围的端点：整数或 Fraction.from_string 支持的字符串"""
+    if isinstance(value, str):
+        return Fraction.from_string(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return Fraction(value, 1)
+    raise ValueError(f"答案范围的端点必须是整数或分数字符串: {value!r}")
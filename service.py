@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP 服务
+基于 asyncio 在本机提供生成题目和验证答案的接口，结果以 JSON 返回，
+计算在工作进程池中进行，同时到达的小请求合并为一次批量调用
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from expression import ExpressionGenerator
+from validator import Validator
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+
+# 合并请求时最多等待的秒数
+BATCH_DELAY = 0.005
+
+# 题目数不少于该值的请求单独处理，小请求累计到该值时立即处理
+BATCH_LIMIT = 1000
+
+# 单个请求最多的题目数
+MAX_REQUEST_SIZE = 100000
+
+# 请求体的最大字节数
+MAX_BODY_SIZE = 64 << 20
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large',
+            500: 'Internal Server Error'}
+
+
+class RequestError(ValueError):
+    """请求参数错误，status 为返回的 HTTP 状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Batcher:
+    """把短时间内到达的小请求合并为一次批量调用
+
+    handler 接收请求参数列表，返回与之一一对应的结果列表。每批的总大小不超过
+    limit（单个请求超过时单独成批）；合并后的调用出错时逐个请求重试，
+    只有出错的请求失败，不影响同一批中的其他请求。
+    """
+
+    def __init__(self, handler, delay=BATCH_DELAY, limit=BATCH_LIMIT):
+        self.handler = handler
+        self.delay = delay
+        self.limit = limit
+        self.batches = 0
+        self._pending = []
+        self._size = 0
+        self._timer = None
+
+    async def submit(self, payload, size):
+        if self._pending and self._size + size > self.limit:
+            self._flush()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        self._size += size
+        if self._size >= self.limit:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._size = self._pending, [], 0
+        if pending:
+            self.batches += 1
+            asyncio.ensure_future(self._run(pending))
+
+    async def _run(self, pending):
+        try:
+            results = await self.handler([payload for payload, _ in pending])
+        except Exception as e:
+            if len(pending) > 1:
+                await asyncio.gather(*(self._run([item]) for item in pending))
+            elif not pending[0][1].done():
+                pending[0][1].set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class ArithmeticService:
+    """生成题目和验证答案的 HTTP 服务
+
+    POST /generate  {"n": 题目数, "r": 数值范围, "seed": 可选的随机种子}
+                    -> {"exercises": [...], "answers": [...]}
+    POST /validate  {"exercises": [...], "answers": [...]}
+                    -> {"correct": [题号...], "wrong": [题号...]}
+    GET  /health    -> {"status": "ok"}
+
+    带 seed 的生成请求不参与合并，保证结果可复现。
+    """
+
+    def __init__(self, workers=None, batch_delay=BATCH_DELAY, batch_limit=BATCH_LIMIT):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_delay = batch_delay
+        self.batch_limit = batch_limit
+        self._pool = None
+        self._generate_batchers = {}
+        self._validate_batcher = Batcher(self._validate_batch, batch_delay, batch_limit)
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        """启动服务并一直运行；ready 为可选的回调，参数为实际监听的端口"""
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            self._pool = pool
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            async with server:
+                if ready is not None:
+                    ready(server.sockets[0].getsockname()[1])
+                await server.serve_forever()
+
+    async def generate(self, params):
+        count = _positive_int(params, 'n')
+        max_value = _positive_int(params, 'r')
+        if count > MAX_REQUEST_SIZE:
+            raise RequestError(f"n 不能超过 {MAX_REQUEST_SIZE}", 413)
+
+        seed = params.get('seed')
+        if seed is not None or count >= self.batch_limit:
+            exercises, answers = await self._run_in_pool(_generate, max_value, count, seed)
+        else:
+            batcher = self._generate_batchers.get(max_value)
+            if batcher is None:
+                # 数值范围很小时不重复的题目有限，合并后的题目数不能超过总数
+                capacity = await self._run_in_pool(_capacity, max_value)
+                limit = min(self.batch_limit, capacity or self.batch_limit)
+                batcher = self._generate_batchers.setdefault(max_value, Batcher(
+                    lambda counts, r=max_value: self._generate_batch(r, counts),
+                    self.batch_delay, limit))
+            exercises, answers = await batcher.submit(count, count)
+        return {'exercises': exercises, 'answers': answers}
+
+    async def validate(self, params):
+        exercises = params.get('exercises')
+        answers = params.get('answers')
+        if not isinstance(exercises, list) or not isinstance(answers, list) \
+                or not all(isinstance(item, str) for item in exercises + answers):
+            raise RequestError("exercises 和 answers 必须是字符串列表")
+        if len(exercises) != len(answers):
+            raise RequestError("exercises 和 answers 的长度必须相同")
+        if len(exercises) > MAX_REQUEST_SIZE:
+            raise RequestError(f"题目数不能超过 {MAX_REQUEST_SIZE}", 413)
+
+        pairs = list(zip(exercises, answers))
+        if len(pairs) >= self.batch_limit:
+            results = await self._run_in_pool(_check_answers, pairs)
+        else:
+            results = await self._validate_batcher.submit(pairs, len(pairs))
+        correct = [i for i, ok in enumerate(results, 1) if ok]
+        wrong = [i for i, ok in enumerate(results, 1) if not ok]
+        return {'correct': correct, 'wrong': wrong}
+
+    async def _generate_batch(self, max_value, counts):
+        """一次生成合并后的全部题目，再按各请求的数量切分"""
+        exercises, answers = await self._run_in_pool(_generate, max_value, sum(counts), None)
+        results = []
+        start = 0
+        for count in counts:
+            results.append((exercises[start:start + count], answers[start:start + count]))
+            start += count
+        return results
+
+    async def _validate_batch(self, pair_lists):
+        """一次判分合并后的全部题目，再按各请求切分"""
+        results = await self._run_in_pool(
+            _check_answers, [pair for pairs in pair_lists for pair in pairs])
+        split = []
+        start = 0
+        for pairs in pair_lists:
+            split.append(results[start:start + len(pairs)])
+            start += len(pairs)
+        return split
+
+    async def _run_in_pool(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    async def _handle_connection(self, reader, writer):
+        """处理一个连接上的请求（支持 HTTP/1.1 持久连接）"""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(_format_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except RequestError as e:
+            writer.write(_format_response(e.status, {'error': str(e)}, False))
+        except ValueError:
+            # 如请求行或请求头过长
+            writer.write(_format_response(400, {'error': "请求格式错误"}, False))
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        routes = {'/generate': self.generate, '/validate': self.validate}
+        try:
+            if path == '/health':
+                return 200, {'status': 'ok'}
+            handler = routes.get(path)
+            if handler is None:
+                raise RequestError(f"未知的路径: {path}", 404)
+            if method != 'POST':
+                raise RequestError("只支持 POST 请求", 405)
+            try:
+                params = json.loads(body or b'{}')
+            except ValueError:
+                raise RequestError("请求体不是合法的 JSON")
+            if not isinstance(params, dict):
+                raise RequestError("请求体必须是 JSON 对象")
+            return 200, await handler(params)
+        except RequestError as e:
+            return e.status, {'error': str(e)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+
+def _generate(max_value, count, seed):
+    """工作进程入口：生成 count 道题目"""
+    if seed is not None:
+        import random
+        random.seed(seed)
+    return ExpressionGenerator(max_value=max_value).generate_expressions(count)
+
+
+def _capacity(max_value):
+    """工作进程入口：该数值范围内不重复题目的总数，不限时为 None"""
+    return ExpressionGenerator(max_value=max_value).capacity()
+
+
+def _check_answers(pairs):
+    """工作进程入口：逐题判断 (题目, 答案) 是否正确"""
+    validator = Validator()
+    return [validator._is_correct(exercise, answer) for exercise, answer in pairs]
+
+
+def _positive_int(params, name):
+    value = params.get(name)
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise RequestError(f"{name} 必须为正整数")
+    return value
+
+
+async def _read_request(reader):
+    """读取一个 HTTP 请求，连接关闭时返回 None"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise RequestError("请求行格式错误")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0) or 0)
+    except ValueError:
+        raise RequestError("Content-Length 必须是整数")
+    if length < 0:
+        raise RequestError("Content-Length 不能为负数")
+    if length > MAX_BODY_SIZE:
+        raise RequestError("请求体过大", 413)
+    body = await reader.readexactly(length) if length else b''
+    return method, target.split('?', 1)[0], headers, body
+
+
+def _format_response(status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+def main():
+    parser = argparse.ArgumentParser(description='四则运算题目生成与验证的本地 HTTP 服务')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'监听地址（默认 {DEFAULT_HOST}）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认 {DEFAULT_PORT}）')
+    parser.add_argument('-j', type=int, help='工作进程数（默认为 CPU 核数）')
+    args = parser.parse_args()
+
+    service = ArithmeticService(workers=args.j)
+    try:
+        asyncio.run(service.serve(args.host, args.port,
+                                  ready=lambda port: print(f"服务已启动：http://{args.host}:{port}")))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
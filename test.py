@@ -5,10 +5,14 @@
 包含各种测试用例
 """
 
+import os
+import tempfile
 import unittest
-from fraction import Fraction
+import fraction
+from fraction import Fraction, FractionArray
 from expression import ExpressionGenerator
 from validator import Validator
+from expression_parser import parse_expression, evaluate_expression
 
 
 class TestFraction(unittest.TestCase):
@@ -23,6 +27,14 @@ class TestFraction(unittest.TestCase):
         f2 = Fraction(4, 8)  # 应该自动约分
         self.assertEqual(f2.numerator, 1)
         self.assertEqual(f2.denominator, 2)
+        
+        # 分子分母只接受整数，分母为 1 的快速路径也要检查
+        for args in ((2.5,), ("3",), (300.5, 1), (1, 2.0), (None, 1)):
+            with self.assertRaises(TypeError):
+                Fraction(*args)
+            with self.assertRaises(TypeError):
+                fraction.LazyFraction(*args)
+        self.assertIs(type(Fraction(True).numerator), int)
     
     def test_from_string(self):
         """测试从字符串创建分数"""
@@ -62,6 +74,111 @@ class TestFraction(unittest.TestCase):
         result = f1 / f2
         self.assertEqual(result.numerator, 3)
         self.assertEqual(result.denominator, 2)
+        
+        # 与整数运算
+        self.assertEqual(f1 + 2, Fraction(5, 2))
+        self.assertEqual(3 - f1, Fraction(5, 2))
+        self.assertEqual(f2 * 6, Fraction(2))
+        self.assertEqual(1 / f2, Fraction(3))
+    
+    def test_value_semantics(self):
+        """测试不可变、可哈希与比较"""
+        f1 = Fraction(2, 4)
+        with self.assertRaises(AttributeError):
+            f1.numerator = 3
+        
+        self.assertEqual(hash(Fraction(3, 1)), hash(3))
+        self.assertEqual(len({Fraction(1, 2), Fraction(2, 4), Fraction(3, 6)}), 1)
+        self.assertTrue(Fraction(1, 3) <= Fraction(1, 2) < 1)
+        self.assertTrue(Fraction(3, 2) >= 1 > Fraction(-1, 2))
+        
+        # 小整数和驻留的真分数复用同一对象
+        Fraction.intern(10)
+        self.assertIs(Fraction(0), Fraction(0, 5))
+        self.assertIs(Fraction(1, 2), Fraction(3, 6))
+    
+    def test_large_operands(self):
+        """测试分母很大时交叉约分和按最小公倍数通分的结果与直接计算一致"""
+        import fractions
+        import random
+        rng = random.Random(1)
+        for _ in range(200):
+            values = [(rng.randint(-10 ** 20, 10 ** 20),
+                       rng.randint(1, 10 ** 20) * rng.choice([1, 6, 30]))
+                      for _ in range(2)]
+            a, b = (Fraction(n, d) for n, d in values)
+            x, y = (fractions.Fraction(n, d) for n, d in values)
+            for result, expected in [(a + b, x + y), (a - b, x - y), (a * b, x * y), (a / b, x / y)]:
+                self.assertEqual((result.numerator, result.denominator),
+                                 (expected.numerator, expected.denominator))
+    
+    def test_lazy_fraction(self):
+        """测试延迟约分的分数与 Fraction 结果一致"""
+        from fraction import LazyFraction
+        
+        def chain(value):
+            for i, operand in enumerate([Fraction(7, 3), Fraction(9, 4), Fraction(1, 6), 2] * 4):
+                if i % 4 == 0:
+                    value = value + operand
+                elif i % 4 == 1:
+                    value = value * operand
+                elif i % 4 == 2:
+                    value = value - operand
+                else:
+                    value = value / operand
+            return value
+        
+        value = chain(LazyFraction(5, 2))
+        expected = chain(Fraction(5, 2))
+        
+        self.assertIsInstance(value, LazyFraction)
+        self.assertEqual(value, expected)
+        self.assertEqual(expected, value)
+        self.assertEqual(hash(value), hash(expected))
+        self.assertEqual(value.to_string(), expected.to_string())
+        self.assertEqual((value.numerator, value.denominator),
+                         (expected.numerator, expected.denominator))
+        self.assertIs(type(LazyFraction(6, 4).to_fraction()), Fraction)
+        self.assertEqual(LazyFraction(6, 4).to_fraction(), Fraction(3, 2))
+        self.assertTrue(Fraction(1, 3) < LazyFraction(2, 4) <= Fraction(1, 2))
+        self.assertEqual(1 - LazyFraction(2, 4), Fraction(1, 2))
+        with self.assertRaises(ValueError):
+            LazyFraction(1, 2) / LazyFraction(0, 3)
+
+
+@unittest.skipIf(fraction.np is None, "需要安装 numpy")
+class TestFractionArray(unittest.TestCase):
+    """分数数组测试"""
+    
+    def setUp(self):
+        self.left = [Fraction(1, 2), Fraction(7, 3), Fraction(0), Fraction(5, 4)]
+        self.right = [Fraction(1, 3), Fraction(2, 3), Fraction(3, 5), Fraction(5, 4)]
+        self.a = FractionArray.from_fractions(self.left)
+        self.b = FractionArray.from_fractions(self.right)
+    
+    def test_arithmetic_matches_fraction(self):
+        """测试逐元素运算与 Fraction 结果一致"""
+        for op in (lambda x, y: x + y, lambda x, y: x - y,
+                   lambda x, y: x * y, lambda x, y: x / y):
+            expected = [op(x, y).to_string() for x, y in zip(self.left, self.right)]
+            self.assertEqual(op(self.a, self.b).to_strings(), expected)
+        
+        self.assertEqual((self.a * 2).to_strings(), ['1', "4'2/3", '0', "2'1/2"])
+    
+    def test_comparisons(self):
+        """测试比较与掩码"""
+        self.assertEqual(list(self.a < self.b), [False, False, True, False])
+        self.assertEqual(list(self.a == self.b), [False, False, False, True])
+        self.assertEqual(self.a[self.a.is_proper()].to_strings(), ['1/2', '0'])
+        with self.assertRaises(ValueError):
+            self.b / self.a
+    
+    def test_overflow_fallback(self):
+        """测试可能溢出时改用 Python 整数"""
+        big = FractionArray([2 ** 40], [3])
+        cube = big * big * big
+        self.assertEqual(cube[0], Fraction(2 ** 120, 27))
+        self.assertEqual((cube / cube).to_strings(), ['1'])
 
 
 class TestExpressionGenerator(unittest.TestCase):
@@ -93,6 +210,373 @@ class TestExpressionGenerator(unittest.TestCase):
             except (ValueError, ZeroDivisionError):
                 # 允许生成过程中出现约束检查失败
                 continue
+    
+    def test_canonical_key(self):
+        """测试交换 + 和 × 的操作数视为重复，结合顺序不同则不重复"""
+        one, two, three = Fraction(1), Fraction(2), Fraction(3)
+        key = self.generator._canonical_key
+        
+        self.assertEqual(key(('+', one, two)), key(('+', two, one)))
+        self.assertEqual(key(('×', ('+', one, two), three)),
+                         key(('×', three, ('+', two, one))))
+        self.assertNotEqual(key(('-', two, one)), key(('-', one, two)))
+        # 1 + 2 + 3 与 3 + (2 + 1) 重复，与 3 + 2 + 1 不重复
+        self.assertEqual(key(('+', ('+', one, two), three)),
+                         key(('+', three, ('+', two, one))))
+        self.assertNotEqual(key(('+', ('+', one, two), three)),
+                            key(('+', ('+', three, two), one)))
+    
+    def test_iter_expressions(self):
+        """测试流式生成"""
+        pairs = list(self.generator.iter_expressions(20))
+        
+        self.assertEqual(len(pairs), 20)
+        for exercise, answer in pairs:
+            self.assertEqual(evaluate_expression(exercise).to_string(), answer)
+    
+    def test_parallel_generation(self):
+        """测试并行生成可复现且全局不重复"""
+        first = ExpressionGenerator(max_value=10).generate_expressions_parallel(
+            40, workers=2, seed=7)
+        second = ExpressionGenerator(max_value=10).generate_expressions_parallel(
+            40, workers=2, seed=7)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(len(first[0]), 40)
+        keys = {self.generator._canonical_key(parse_expression(exercise))
+                for exercise in first[0]}
+        self.assertEqual(len(keys), 40)
+    
+    @unittest.skipIf(fraction.np is None, "需要安装 numpy")
+    def test_batch_generation(self):
+        """测试按模板批量求值生成的题目满足约束且答案正确"""
+        generator = ExpressionGenerator(max_value=10, batch_size=4096)
+        exercises, answers = generator.generate_expressions(300)
+        
+        self.assertEqual(len(exercises), 300)
+        for exercise, answer in zip(exercises, answers):
+            self.assertEqual(evaluate_expression(exercise).to_string(), answer)
+    
+    @unittest.skipIf(fraction.np is None, "需要安装 numpy")
+    def test_compiled_template(self):
+        """测试编译后的模板与逐个求值结果一致"""
+        from batch_evaluator import enumerate_templates
+        
+        templates = enumerate_templates(self.generator.operators)
+        self.assertEqual(len(templates), 4 + 16 + 64 * 2)
+        self.assertAlmostEqual(sum(t.weight for t in templates), 1.0)
+        
+        operands = [FractionArray([1, 3, 0]), FractionArray([1, 2, 0], [2, 3, 1]),
+                    FractionArray([2, 1, 5])]
+        for template in templates:
+            if template.operand_count != 3:
+                continue
+            values, valid = template.evaluate(operands, {})
+            for k in range(3):
+                tree = template.instantiate([column[k] for column in operands])
+                try:
+                    expected = self.generator._evaluate_expression_tree(tree)
+                except ValueError:
+                    self.assertFalse(valid[k])
+                else:
+                    self.assertTrue(valid[k])
+                    self.assertEqual(values[k], expected)
+    
+    def test_generation_stats(self):
+        """测试生成统计的计数与分类"""
+        generator = ExpressionGenerator(max_value=10, collect_stats=True)
+        generator.generate_expressions(200)
+        stats = generator.stats
+        
+        self.assertEqual(stats.accepted, 200)
+        self.assertEqual(stats.attempts,
+                         stats.accepted + stats.duplicates + stats.total_rejections())
+        self.assertTrue(set(stats.rejections) <= {'negative_subtraction', 'zero_divisor',
+                                                   'improper_quotient'})
+        self.assertGreater(stats.timings['evaluate'], 0)
+    
+    def test_question_index(self):
+        """测试小数值范围时穷举索引的容量与无放回抽样"""
+        from question_index import QuestionIndex
+        
+        index = QuestionIndex.build(ExpressionGenerator(max_value=2, use_index=False))
+        keys = list(index.keys())
+        self.assertEqual(len(keys), len(set(keys)))
+        for position in range(500):
+            key, exercise, answer = index.record(position)
+            self.assertEqual(key, keys[position])
+            self.assertEqual(evaluate_expression(exercise).to_string(), answer)
+        
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                generator = ExpressionGenerator(max_value=2)
+                self.assertEqual(generator.capacity(), index.capacity)
+                exercises, _ = generator.generate_expressions(index.capacity - 10)
+                self.assertEqual(len(set(exercises)), index.capacity - 10)
+                with self.assertRaises(ValueError):
+                    generator.generate_expressions(11)
+                
+                # 缓存写入后可以读回；缓存目录无法创建时只在内存中使用
+                built = QuestionIndex.load_or_build(generator, cache_dir='cache')
+                loaded = QuestionIndex.load_or_build(generator, 'cache')
+                self.assertEqual(list(loaded.keys()), list(built.keys()))
+                self.assertEqual(loaded.record(index.capacity - 1),
+                                 built.record(index.capacity - 1))
+                open('not_a_dir', 'w').close()
+                unwritable = os.path.join('not_a_dir', 'cache')
+                self.assertEqual(QuestionIndex.load_or_build(generator, unwritable).capacity,
+                                 index.capacity)
+            finally:
+                os.chdir(old_cwd)
+    
+    def test_question_bank(self):
+        """测试题库跨多次生成去重，并可按条件取出题目"""
+        from question_bank import QuestionBank
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bank.db')
+            with QuestionBank(path) as bank:
+                first, _ = ExpressionGenerator(max_value=10, bank=bank).generate_expressions(300)
+                self.assertEqual(len(bank), 300)
+
+            # 重新打开题库，新生成的题目不应与之前的重复
+            with QuestionBank(path) as bank:
+                generator = ExpressionGenerator(max_value=10, bank=bank)
+                second, _ = generator.generate_expressions(300)
+                self.assertEqual(len(bank), 600)
+                self.assertFalse(set(first) & set(second))
+
+                pairs = bank.fetch(50, max_value=10, operator_count=1)
+                self.assertEqual(len(pairs), 50)
+                for exercise, answer in pairs:
+                    self.assertEqual(sum(map(exercise.count, '+-×÷')), 1)
+                    self.assertEqual(evaluate_expression(exercise).to_string(), answer)
+                self.assertEqual(bank.fetch(10, max_value=5), [])
+            
+            # 题库的去重键不区分数值范围：-r 1 的题目也在 -r 2 的穷举索引中
+            with QuestionBank(os.path.join(tmpdir, 'small.db')) as bank:
+                ExpressionGenerator(max_value=1, bank=bank).generate_expressions(60)
+                generator = ExpressionGenerator(max_value=2, bank=bank)
+                remaining = generator.remaining_capacity()
+                self.assertEqual(remaining, generator.capacity() - 60)
+                generator.generate_expressions(remaining)
+                self.assertEqual(ExpressionGenerator(max_value=2, bank=bank).remaining_capacity(), 0)
+
+    def test_expression_pool(self):
+        """测试子表达式池与不使用池时结果相同，且节点数不超过上限"""
+        import random
+        from expression_pool import ExpressionPool
+
+        random.seed(7)
+        expected = ExpressionGenerator(max_value=5, use_index=False).generate_expressions(500)
+        random.seed(7)
+        generator = ExpressionGenerator(max_value=5, use_index=False, pool_size=100)
+        self.assertEqual(generator.generate_expressions(500), expected)
+        self.assertLessEqual(len(generator._pool._nodes), 100)
+        self.assertGreater(generator._pool.hits, 0)
+
+        pool = ExpressionPool(ExpressionGenerator(max_value=5))
+        tree = ('×', Fraction(1, 2), Fraction(3, 1))
+        node = pool.intern(tree)
+        self.assertIs(pool.intern(tree), node)
+        self.assertEqual(node.value, Fraction(3, 2))
+        self.assertEqual(pool.text(pool.intern(('-', tree, Fraction(1, 1)))), "1/2 × 3 - 1")
+        with self.assertRaises(ValueError):
+            pool.intern(('-', Fraction(1, 1), tree))
+
+    def test_postfix_encoding(self):
+        """测试紧凑后缀编码的求值、格式化和去重键与表达式树一致"""
+        from postfix_expression import PostfixCodec, ExpressionStore
+
+        codec = PostfixCodec(self.generator)
+        store = ExpressionStore(codec)
+        trees = []
+        while len(trees) < 200:
+            try:
+                trees.append(self.generator._generate_single_tree(len(trees) % 3 + 1))
+            except ValueError:
+                continue
+            store.append(trees[-1][0])
+
+        self.assertEqual(len(store), 200)
+        for (tree, result), code in zip(trees, store):
+            self.assertLessEqual(len(code), 7)
+            self.assertEqual(codec.decode(code), tree)
+            self.assertEqual(codec.evaluate(code), result)
+            self.assertEqual(codec.render(code), self.generator._tree_to_string(tree))
+            self.assertEqual(codec.canonical_key(code), self.generator._canonical_key(tree))
+        with self.assertRaises(ValueError):
+            codec.encode(('+', Fraction(1, 1), Fraction(1, 11)))
+
+    def test_bloom_dedup(self):
+        """测试 Bloom 过滤器去重的误判率和精确核对"""
+        from dedup import BloomKeySet
+
+        keys = [bytes([i % 256, i // 256, 7, 1, 2, 3, 4, i % 13]) for i in range(5000)]
+        others = [bytes([i % 256, i // 256, 9, 8, 6, 5, 4, i % 11]) for i in range(5000)]
+        approximate = BloomKeySet(len(keys), error_rate=0.01)
+        for key in keys:
+            approximate.add(key)
+        self.assertTrue(all(key in approximate for key in keys))
+        self.assertLess(sum(key in approximate for key in others), 150)
+
+        # 过滤器很小、误判很多时，精确核对仍然不会误判
+        with BloomKeySet(len(keys), max_bytes=64, verify=True, buffer_size=300) as exact:
+            for key in keys:
+                exact.add(key)
+            self.assertTrue(all(key in exact for key in keys))
+            self.assertFalse(any(key in exact for key in others))
+
+        generator = ExpressionGenerator(max_value=10, dedup=BloomKeySet(300))
+        exercises, _ = generator.generate_expressions(300)
+        self.assertEqual(len(set(exercises)), 300)
+
+    def test_append_with_sidecar(self):
+        """测试追加题目时读取去重键索引、接着编号，失败时回滚"""
+        import question_set
+        import validator
+
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                question_set.write_questions(self.generator.iter_records(100),
+                                             'Exercises.txt', 'Answers.txt')
+                generator = ExpressionGenerator(max_value=10)
+                keys = question_set.load_keys('Exercises.txt', generator)
+                self.assertEqual(len(keys), 100)
+                generator.generated_expressions.update(keys)
+                question_set.append_questions(generator.iter_records(50),
+                                              'Exercises.txt', 'Answers.txt')
+
+                exercises = list(Validator()._iter_numbered('Exercises.txt',
+                                                            validator._EXERCISE_BUFFER_PATTERN))
+                self.assertEqual([number for number, _ in exercises], list(range(1, 151)))
+                self.assertEqual(len({text for _, text in exercises}), 150)
+
+                # 生成中途出错时三个文件都恢复原状
+                sizes = [os.path.getsize(name) for name in
+                         ('Exercises.txt', 'Answers.txt', 'Exercises.txt.keys')]
+
+                def failing_records():
+                    yield from generator.iter_records(5)
+                    raise RuntimeError("中断")
+
+                with self.assertRaises(RuntimeError):
+                    question_set.append_questions(failing_records(), 'Exercises.txt', 'Answers.txt')
+                self.assertEqual([os.path.getsize(name) for name in
+                                  ('Exercises.txt', 'Answers.txt', 'Exercises.txt.keys')], sizes)
+
+                # 索引文件缺失时解析题目文件重建
+                os.remove('Exercises.txt.keys')
+                rebuilt = question_set.load_keys('Exercises.txt', generator)
+                self.assertEqual(rebuilt[:100], keys)
+                self.assertEqual(len(rebuilt), 150)
+                self.assertTrue(os.path.exists('Exercises.txt.keys'))
+                
+                # 分页生成的文件不从 1 开始编号，追加时接着最后一个题号
+                question_set.write_questions(self.generator.iter_records(5), 'Exercises.txt',
+                                             'Answers.txt', start=11, keys=False)
+                question_set.load_keys('Exercises.txt', generator)
+                self.assertEqual(question_set.next_number('Exercises.txt'), 16)
+                question_set.append_questions(generator.iter_records(3),
+                                              'Exercises.txt', 'Answers.txt')
+                exercises = list(Validator()._iter_numbered('Exercises.txt',
+                                                            validator._EXERCISE_BUFFER_PATTERN))
+                self.assertEqual([number for number, _ in exercises], list(range(11, 19)))
+            finally:
+                os.chdir(old_cwd)
+
+    def test_constructive_generation(self):
+        """测试构造式生成满足约束且拒绝率更低"""
+        generator = ExpressionGenerator(max_value=10, constructive=True)
+        exercises, answers = generator.generate_expressions(200)
+        
+        self.assertEqual(len(exercises), 200)
+        for exercise, answer in zip(exercises, answers):
+            self.assertEqual(evaluate_expression(exercise).to_string(), answer)
+        self.assertLess(generator.rejection_rate(), 0.3)
+
+    def test_addressable_worksheet(self):
+        """测试分页生成：任意一页可单独生成，结果可复现且各题不重复"""
+        from addressable import AddressableWorksheet, KeyedPermutation
+        
+        permutation = KeyedPermutation(1000, 'key')
+        self.assertEqual(sorted(permutation(i) for i in range(1000)), list(range(1000)))
+        
+        worksheet = AddressableWorksheet(10, 1000000, seed=1)
+        page = worksheet.page(5000, 20)
+        self.assertEqual([number for number, _, _ in page], list(range(99981, 100001)))
+        for _, exercise, answer in page:
+            self.assertEqual(evaluate_expression(exercise).to_string(), answer)
+        
+        # 相同的种子得到相同的题目，与生成顺序无关
+        again = AddressableWorksheet(10, 1000000, seed=1)
+        self.assertEqual(again.record(99999), worksheet.record(99999))
+        self.assertNotEqual(AddressableWorksheet(10, 1000000, seed=2).page(5000, 20), page)
+        
+        keys = [worksheet.record(i)[0] for i in range(3000)]
+        self.assertEqual(len(set(keys)), len(keys))
+        
+        # 数值范围很小时从穷举索引中取题，不能超过不重复题目的总数
+        small = AddressableWorksheet(2, 50, seed=1)
+        self.assertEqual(len({small.record(i)[0] for i in range(50)}), 50)
+        with self.assertRaises(ValueError):
+            AddressableWorksheet(2, 10 ** 6)
+        
+        # 写出的一页带去重键索引，追加时接着该页的题号且不与该页重复
+        import question_set
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                question_set.write_questions(worksheet.iter_records(10, 15), 'Exercises.txt',
+                                             'Answers.txt', start=11)
+                generator = ExpressionGenerator(max_value=10)
+                keys = question_set.load_keys('Exercises.txt', generator)
+                self.assertEqual(keys, [worksheet.record(i)[0] for i in range(10, 15)])
+                generator.generated_expressions.update(keys)
+                question_set.append_questions(generator.iter_records(3),
+                                              'Exercises.txt', 'Answers.txt')
+                self.assertEqual(question_set.next_number('Exercises.txt'), 19)
+                self.assertEqual(len(set(question_set.load_keys('Exercises.txt', generator))), 8)
+            finally:
+                os.chdir(old_cwd)
+
+    def test_quota_generation(self):
+        """测试按规格生成：各项特征的题数恰好达到配额"""
+        import random
+        from quota import QuotaSpec, QuotaSampler
+
+        spec = QuotaSpec.from_dict({
+            'operator_counts': {'3': 0.4}, 'operators': {'/': 0.2},
+            'fractions': 0.3, 'parentheses': 0.2,
+            'answer_range': {'min': 0, 'max': 10, 'share': 0.5}})
+        random.seed(1)
+        generator = ExpressionGenerator(max_value=10)
+        records = list(QuotaSampler(generator, spec).iter_records(100))
+
+        self.assertEqual(len({key for key, _, _ in records}), 100)
+        counts = {'three': 0, 'division': 0, 'fractions': 0, 'parentheses': 0, 'answer': 0}
+        for _, exercise, answer in records:
+            self.assertEqual(evaluate_expression(exercise).to_string(), answer)
+            operators = [token for token in exercise.split() if token in '+-×÷']
+            operands = [token for token in exercise.replace('(', '').replace(')', '').split()
+                        if token not in '+-×÷']
+            counts['three'] += len(operators) == 3
+            counts['division'] += '÷' in operators
+            counts['fractions'] += any('/' in token for token in operands)
+            counts['parentheses'] += '(' in exercise
+            counts['answer'] += Fraction.from_string(answer) <= Fraction(10)
+        self.assertEqual(counts, {'three': 40, 'division': 20, 'fractions': 30,
+                                  'parentheses': 20, 'answer': 50})
+
+        # 相互矛盾的配额：只有一个运算符的题目不可能有括号
+        spec = QuotaSpec.from_dict({'operator_counts': {'1': 1}, 'parentheses': 0.5})
+        with self.assertRaises(ValueError):
+            list(QuotaSampler(ExpressionGenerator(max_value=10), spec).iter_records(10))
 
 
 class TestValidator(unittest.TestCase):
@@ -117,6 +601,11 @@ class TestValidator(unittest.TestCase):
         result = self.validator._parse_operand("2'3/8")
         self.assertEqual(result.numerator, 19)
         self.assertEqual(result.denominator, 8)
+        
+        # 格式不正确的数
+        for text in ("2'3", "1/2/3", "2'1'3/4", "a"):
+            with self.assertRaises(ValueError):
+                self.validator._parse_operand(text)
     
     def test_calculate_expression(self):
         """测试表达式计算"""
@@ -127,6 +616,250 @@ class TestValidator(unittest.TestCase):
         # 带括号的表达式
         result = self.validator._calculate_expression("(1 + 2) × 3")
         self.assertEqual(result.to_string(), "9")
+    
+    def _run_in_tempdir(self, exercises, answers, method):
+        """在临时目录中写入题目和答案文件并验证，返回 Grade.txt 内容"""
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                with open('Exercises.txt', 'w', encoding='utf-8') as f:
+                    f.write(exercises)
+                with open('Answers.txt', 'w', encoding='utf-8') as f:
+                    f.write(answers)
+                method('Exercises.txt', 'Answers.txt')
+                with open('Grade.txt', 'r', encoding='utf-8') as f:
+                    return f.read()
+            finally:
+                os.chdir(old_cwd)
+    
+    def test_validate_stream(self):
+        """测试流式验证按题号对齐并压缩区间"""
+        exercises = "".join(f"{i}. {i} + 1 = \n" for i in range(1, 7))
+        # 缺少第4题的答案，第6题答错，多出的第9题答案被忽略
+        answers = "1. 2\n2. 3\n3. 4\n5. 6\n6. 0\n9. 10\n"
+        
+        grade = self._run_in_tempdir(exercises, answers,
+                                     self.validator.validate_stream)
+        self.assertEqual(grade, "Correct: 4 (1-3, 5)\nWrong: 2 (4, 6)\n")
+        
+        # 格式不正确的答案记为错误
+        grade = self._run_in_tempdir(exercises, answers.replace("3. 4", "3. 2'3"),
+                                     self.validator.validate_stream)
+        self.assertEqual(grade, "Correct: 3 (1-2, 5)\nWrong: 3 (3-4, 6)\n")
+    
+    def test_validate_parallel(self):
+        """测试分块并行验证与顺序验证结果一致"""
+        exercises = "".join(f"{i}. {i} × 2 = \n" for i in range(1, 101))
+        answers = "".join(f"{i}. {i * 2 if i % 7 else 0}\n" for i in range(1, 101))
+        
+        expected = self._run_in_tempdir(exercises, answers, self.validator.validate)
+        grade = self._run_in_tempdir(
+            exercises, answers,
+            lambda e, a: self.validator.validate_parallel(e, a, workers=3))
+        self.assertEqual(grade, expected)
+        
+        # 切分点与工作进程按同样的格式识别题号行（BOM、CRLF、不合格式的行）
+        exercises = "\ufeff" + exercises.replace("0. ", "0. 1 = ").replace("\n", "\r\n")
+        answers = "\ufeff" + answers.replace("\n", "\r\n")
+        grade = self._run_in_tempdir(
+            exercises, answers,
+            lambda e, a: self.validator.validate_parallel(e, a, workers=7))
+        correct = [i for i in range(1, 101) if i % 7 and i % 10]
+        wrong = [i for i in range(1, 101) if i % 10 and not i % 7]
+        self.assertEqual(grade, f"Correct: {len(correct)} ({', '.join(map(str, correct))})\n"
+                                f"Wrong: {len(wrong)} ({', '.join(map(str, wrong))})\n")
+
+    
+    def test_read_bom_crlf_and_empty(self):
+        """测试批量读取兼容 BOM、CRLF 换行和空文件"""
+        exercises = "\ufeff1. 1 + 2 = \r\n2. 3 - 1 =\r\n\r\n# 注释\r\n3. 1/2 × 4 ="
+        answers = "\ufeff1. 3\r\n2. 2 \r\n3. 1\r\n"
+        
+        grade = self._run_in_tempdir(exercises, answers, self.validator.validate)
+        self.assertEqual(grade, "Correct: 2 (1, 2)\nWrong: 1 (3)\n")
+        grade = self._run_in_tempdir(exercises, answers, self.validator.validate_stream)
+        self.assertEqual(grade, "Correct: 2 (1-2)\nWrong: 1 (3)\n")
+        grade = self._run_in_tempdir("", "", self.validator.validate)
+        self.assertEqual(grade, "Correct: 0 ()\nWrong: 0 ()\n")
+    
+    def test_validate_many(self):
+        """测试标准答案只计算一次、批改多份答案并统计错误率"""
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                with open('Exercises.txt', 'w', encoding='utf-8') as f:
+                    f.write("1. 1 + 1 = \n2. 1/2 × 3 = \n3. 5 - 2 = \n")
+                os.mkdir('answers')
+                submissions = {'alice': "1. 2\n2. 1'1/2\n3. 3\n",
+                               'bob': "1. 2\n2. 3/2\n3. 4\n",
+                               'carol': "2. 1'1/2\n3. x\n"}
+                for name, content in submissions.items():
+                    with open(os.path.join('answers', f'{name}.txt'), 'w', encoding='utf-8') as f:
+                        f.write(content)
+                
+                results = self.validator.validate_many('Exercises.txt', ['answers'], workers=2)
+                self.assertEqual(results[os.path.join('answers', 'bob.txt')], ([1, 2], [3]))
+                with open(os.path.join('grades', 'Grade_carol.txt'), encoding='utf-8') as f:
+                    self.assertEqual(f.read(), "Correct: 1 (2)\nWrong: 2 (1, 3)\n")
+                with open(os.path.join('grades', 'Report.txt'), encoding='utf-8') as f:
+                    self.assertEqual(f.read(), "Submissions: 3\n1: 1/3 (33.3%)\n"
+                                               "2: 0/3 (0.0%)\n3: 2/3 (66.7%)\n")
+                
+                # 不同目录中的同名答案文件各自生成成绩文件
+                for name in ('alice', 'bob'):
+                    os.makedirs(os.path.join('subs', name))
+                    with open(os.path.join('subs', name, 'Answers.txt'), 'w',
+                              encoding='utf-8') as f:
+                        f.write(submissions[name])
+                self.validator.validate_many('Exercises.txt', [os.path.join('subs', 'alice'),
+                                                               os.path.join('subs', 'bob')])
+                with open(os.path.join('grades', 'Grade_alice_Answers.txt'), encoding='utf-8') as f:
+                    self.assertEqual(f.read(), "Correct: 3 (1, 2, 3)\nWrong: 0 ()\n")
+                with self.assertRaises(ValueError):
+                    self.validator.validate_many('Exercises.txt', ['answers', 'answers'])
+            finally:
+                os.chdir(old_cwd)
+
+class TestExpressionParser(unittest.TestCase):
+    """表达式解析器测试"""
+    
+    def test_operator_precedence(self):
+        """测试运算符优先级与左结合"""
+        self.assertEqual(evaluate_expression("3 - 1/2 × 2").to_string(), "2")
+        self.assertEqual(evaluate_expression("6 ÷ 3 × 2").to_string(), "4")
+        self.assertEqual(evaluate_expression("5 - 2 - 1").to_string(), "2")
+    
+    def test_fraction_and_division(self):
+        """测试区分分数与除号"""
+        tree = parse_expression("3/5 ÷ 2'1/4")
+        self.assertEqual(tree, ('÷', Fraction(3, 5), Fraction(9, 4)))
+        self.assertEqual(evaluate_expression("3/5 ÷ 3").to_string(), "1/5")
+    
+    def test_parentheses(self):
+        """测试括号"""
+        self.assertEqual(evaluate_expression("(1 + 2) × (3 - 1/2)").to_string(), "7'1/2")
+        with self.assertRaises(ValueError):
+            parse_expression("(1 + 2")
+    
+    def test_constraints(self):
+        """测试负数与除零检查"""
+        with self.assertRaises(ValueError):
+            evaluate_expression("1 - 2")
+        with self.assertRaises(ValueError):
+            evaluate_expression("1 ÷ 0")
+
+
+class TestService(unittest.TestCase):
+    """本地 HTTP 服务测试"""
+    
+    def test_generate_and_validate(self):
+        """测试生成、验证接口以及小请求的合并"""
+        import asyncio
+        import http.client
+        import json
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from service import ArithmeticService, Batcher
+        
+        service = ArithmeticService(workers=1, batch_delay=0.05)
+        ports = []
+        ready = threading.Event()
+        
+        def on_ready(port):
+            ports.append(port)
+            ready.set()
+        
+        threading.Thread(target=lambda: asyncio.run(service.serve('127.0.0.1', 0, on_ready)),
+                         daemon=True).start()
+        self.assertTrue(ready.wait(10))
+        
+        def call(path, body):
+            connection = http.client.HTTPConnection('127.0.0.1', ports[0], timeout=10)
+            connection.request('POST', path, json.dumps(body))
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        
+        with ThreadPoolExecutor(8) as executor:
+            responses = list(executor.map(lambda _: call('/generate', {'n': 5, 'r': 10}),
+                                          range(8)))
+        for status, body in responses:
+            self.assertEqual(status, 200)
+            self.assertEqual(len(body['exercises']), 5)
+        self.assertLess(service._generate_batchers[10].batches, 8)
+        
+        _, body = responses[0]
+        body['answers'][1] = '999'
+        self.assertEqual(call('/validate', body),
+                         (200, {'correct': [1, 3, 4, 5], 'wrong': [2]}))
+        self.assertEqual(call('/generate', {'n': 0, 'r': 10})[0], 400)
+        self.assertEqual(call('/unknown', {})[0], 404)
+        self.assertEqual(call('/validate', {'exercises': ['1 + 1'], 'answers': []})[0], 400)
+        
+        # 请求头格式错误时返回 400，而不是直接断开连接
+        import socket
+        for length in ('abc', '-5'):
+            with socket.create_connection(('127.0.0.1', ports[0]), timeout=10) as sock:
+                sock.sendall(f'POST /validate HTTP/1.1\r\nContent-Length: {length}\r\n\r\n'
+                             .encode('latin-1'))
+                self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.1 400'))
+        
+        # 同一批中某个请求出错不影响其他请求
+        batcher_results = []
+        
+        async def handler(payloads):
+            if 'bad' in payloads:
+                raise ValueError('bad')
+            return [payload.upper() for payload in payloads]
+        
+        async def submit_all():
+            batcher = Batcher(handler, delay=0.01, limit=3)
+            results = await asyncio.gather(*(batcher.submit(payload, 1) for payload
+                                             in ['a', 'bad', 'b', 'c']),
+                                           return_exceptions=True)
+            batcher_results.extend(results)
+            return batcher.batches
+        
+        self.assertEqual(asyncio.run(submit_all()), 2)
+        self.assertEqual(batcher_results[0::2], ['A', 'B'])
+        self.assertIsInstance(batcher_results[1], ValueError)
+        self.assertEqual(batcher_results[3], 'C')
+        
+        # 数值范围很小时，合并后的题目数不超过不重复题目的总数
+        capacity = ExpressionGenerator(max_value=1).capacity()
+        with ThreadPoolExecutor(2) as executor:
+            responses = list(executor.map(
+                lambda _: call('/generate', {'n': capacity, 'r': 1}), range(2)))
+        self.assertEqual([status for status, _ in responses], [200, 200])
+
+
+class TestWorker(unittest.TestCase):
+    """常驻工作进程测试"""
+    
+    def test_json_lines_jobs(self):
+        """测试逐行处理任务并在任务之间复用生成器"""
+        import io
+        import json
+        from worker import Worker
+        
+        jobs = [{'id': 1, 'op': 'generate', 'n': 20, 'r': 10},
+                {'id': 2, 'op': 'generate', 'n': 20, 'r': 10},
+                {'id': 3, 'op': 'validate', 'exercises': ['1 + 1', '1/2 × 3'],
+                 'answers': ["2'3", '3/2']},
+                {'id': 4, 'op': 'generate', 'n': -1, 'r': 10},
+                {'id': 5, 'op': 'validate', 'exercises': ['1 + 1'], 'answers': []}]
+        worker = Worker()
+        output = io.StringIO()
+        worker.run(io.StringIO('\n'.join(map(json.dumps, jobs)) + '\nnot json\n'), output)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        
+        self.assertEqual([result.get('id') for result in results], [1, 2, 3, 4, 5, None])
+        self.assertEqual(len(results[1]['exercises']), 20)
+        self.assertEqual(len(worker._generators), 1)
+        self.assertEqual((results[2]['correct'], results[2]['wrong']), ([2], [1]))
+        self.assertEqual([result['ok'] for result in results],
+                         [True, True, True, False, False, False])
 
 
 def run_tests():
@@ -136,8 +869,12 @@ def run_tests():
     
     # 添加测试类
     suite.addTest(unittest.makeSuite(TestFraction))
+    suite.addTest(unittest.makeSuite(TestFractionArray))
     suite.addTest(unittest.makeSuite(TestExpressionGenerator))
     suite.addTest(unittest.makeSuite(TestValidator))
+    suite.addTest(unittest.makeSuite(TestExpressionParser))
+    suite.addTest(unittest.makeSuite(TestService))
+    suite.addTest(unittest.makeSuite(TestWorker))
     
     # 运行测试
     runner = unittest.TextTestRunner(verbosity=2)
@@ -5,8 +5,47 @@
 验证答案的正确性并生成统计结果
 """
 
+import codecs
+import contextlib
+import mmap
+import os
 import re
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 from fraction import Fraction
+from expression_parser import evaluate_expression
+
+
+# 题目行与答案行的格式：题号. 内容，在整个文件缓冲区上逐行匹配（兼容 CRLF 换行）
+_EXERCISE_BUFFER_PATTERN = re.compile(
+    rb'^[ \t]*(\d+)\.[ \t]*((?:[^=\r\n]*[^=\s])?)[ \t]*=[ \t\r]*$', re.M)
+_ANSWER_BUFFER_PATTERN = re.compile(rb'^[ \t]*(\d+)\.[ \t]*((?:[^\r\n]*[^\s])?)[ \t\r]*$', re.M)
+
+
+class IndexRanges:
+    """按升序追加的题号集合，以连续区间形式保存
+
+    内存占用与区间数成正比，而不是与题号数成正比。
+    """
+    
+    def __init__(self):
+        self.ranges = []
+        self.count = 0
+    
+    def add(self, index):
+        """追加一个题号"""
+        self.count += 1
+        if self.ranges and self.ranges[-1][1] + 1 == index:
+            self.ranges[-1][1] = index
+        else:
+            self.ranges.append([index, index])
+    
+    def __len__(self):
+        return self.count
+    
+    def __str__(self):
+        return ', '.join(str(start) if start == end else f"{start}-{end}"
+                         for start, end in self.ranges)
 
 
 class Validator:
@@ -25,118 +64,184 @@ class Validator:
         wrong_indices = []
         
         for i, (exercise, expected_answer) in enumerate(zip(exercises, answers), 1):
-            try:
-                # 计算题目正确答案
-                correct_result = self._calculate_expression(exercise)
-                
-                # 解析用户答案
-                user_answer = self._parse_answer(expected_answer)
-                
-                # 比较答案
-                if correct_result == user_answer:
-                    correct_indices.append(i)
-                else:
-                    wrong_indices.append(i)
-                    
-            except (ValueError, ZeroDivisionError) as e:
-                # 如果计算过程中出现错误，视为错误答案
+            if self._is_correct(exercise, expected_answer):
+                correct_indices.append(i)
+            else:
                 wrong_indices.append(i)
         
         # 生成统计结果
         self._generate_grade_file(correct_indices, wrong_indices)
     
+    def validate_stream(self, exercise_file, answer_file):
+        """流式验证答案文件
+
+        两个文件按题号逐行同步读取、边读边判，不把题目和答案载入内存；
+        题号可以不连续，没有答案的题目记为错误，没有对应题目的答案被忽略。
+        Grade.txt 中连续的题号压缩为区间（如 1-500, 502）。
+        """
+        correct_indices = IndexRanges()
+        wrong_indices = IndexRanges()
+        
+        pairs = self._iter_pairs(self._iter_numbered(exercise_file, _EXERCISE_BUFFER_PATTERN),
+                                 self._iter_numbered(answer_file, _ANSWER_BUFFER_PATTERN))
+        for number, exercise, answer in pairs:
+            if answer is not None and self._is_correct(exercise, answer):
+                correct_indices.add(number)
+            else:
+                wrong_indices.add(number)
+        
+        self._generate_grade_file(correct_indices, wrong_indices)
+    
+    def validate_parallel(self, exercise_file, answer_file, workers):
+        """多进程分块验证答案文件
+
+        题目文件按字节切成 workers 段（边界对齐到行首），答案文件在每段
+        第一道题的题号处切开，各段在工作进程中按题号对齐并判分，
+        主进程按顺序合并正确和错误的题号。两个文件中的题号都应按升序排列。
+        """
+        chunks = _split_chunks(exercise_file, answer_file, workers)
+        
+        correct_indices = []
+        wrong_indices = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_grade_chunk,
+                               [exercise_file] * len(chunks),
+                               [answer_file] * len(chunks),
+                               chunks)
+            for correct, wrong in results:
+                correct_indices.extend(correct)
+                wrong_indices.extend(wrong)
+        
+        self._generate_grade_file(correct_indices, wrong_indices)
+    
+    def validate_many(self, exercise_file, answer_files, workers=1, output_dir='grades'):
+        """用同一份题目批改多份答案
+
+        题目文件只解析、计算一次得到标准答案，之后各答案文件（可以是目录，
+        取其中的 .txt 文件）按题号对照标准答案判分，workers > 1 时多进程并行。
+        每份答案在 output_dir 中生成 Grade_<文件名>.txt（文件名取相对于各答案文件
+        共同目录的路径，见 _grade_file_names），另生成 Report.txt
+        统计每道题的错误人数和错误率。返回 {答案文件: (正确题号列表, 错误题号列表)}。
+        """
+        answer_files = _expand_answer_files(answer_files)
+        grade_files = _grade_file_names(answer_files)
+        answer_key = self.build_answer_key(exercise_file)
+        
+        if workers > 1 and len(answer_files) > 1:
+            # 标准答案在进程启动时传给工作进程一次，而不是随每份答案传递
+            with ProcessPoolExecutor(max_workers=workers, initializer=_set_answer_key,
+                                     initargs=(answer_key,)) as pool:
+                results = list(pool.map(_grade_submission, answer_files))
+        else:
+            results = [self.grade_answers(answer_key, answer_file)
+                       for answer_file in answer_files]
+        
+        os.makedirs(output_dir, exist_ok=True)
+        wrong_counts = dict.fromkeys(answer_key, 0)
+        for grade_file, (correct_indices, wrong_indices) in zip(grade_files, results):
+            self._generate_grade_file(correct_indices, wrong_indices,
+                                      os.path.join(output_dir, grade_file))
+            for number in wrong_indices:
+                wrong_counts[number] += 1
+        self._generate_report_file(wrong_counts, len(answer_files),
+                                   os.path.join(output_dir, 'Report.txt'))
+        return dict(zip(answer_files, results))
+    
+    def build_answer_key(self, exercise_file):
+        """解析并计算题目文件，返回 {题号: 正确答案}，无法计算的题目为 None"""
+        answer_key = {}
+        for number, exercise in self._iter_numbered(exercise_file, _EXERCISE_BUFFER_PATTERN):
+            try:
+                answer_key[number] = self._calculate_expression(exercise)
+            except (ValueError, ZeroDivisionError):
+                answer_key[number] = None
+        return answer_key
+    
+    def grade_answers(self, answer_key, answer_file):
+        """按标准答案批改一份答案文件，返回 (正确题号列表, 错误题号列表)
+
+        没有作答或无法解析的题目记为错误，标准答案中没有的题号被忽略。
+        """
+        answers = dict(self._iter_numbered(answer_file, _ANSWER_BUFFER_PATTERN))
+        correct_indices = []
+        wrong_indices = []
+        for number, expected in answer_key.items():
+            answer = answers.get(number)
+            try:
+                correct = (answer is not None and expected is not None
+                           and self._parse_answer(answer) == expected)
+            except (ValueError, ZeroDivisionError):
+                correct = False
+            if correct:
+                correct_indices.append(number)
+            else:
+                wrong_indices.append(number)
+        return correct_indices, wrong_indices
+    
+    def _iter_pairs(self, exercises, answers):
+        """按题号对齐题目和答案，产出 (题号, 题目, 答案或 None)
+
+        exercises 和 answers 为按题号升序排列的 (题号, 内容) 序列。
+        """
+        answers = iter(answers)
+        answer_number, answer = next(answers, (None, None))
+        
+        for number, exercise in exercises:
+            # 跳过没有对应题目的答案
+            while answer_number is not None and answer_number < number:
+                answer_number, answer = next(answers, (None, None))
+            
+            if answer_number == number:
+                yield number, exercise, answer
+            else:
+                yield number, exercise, None
+    
+    def _iter_numbered(self, filename, pattern):
+        """读取带题号的文件，产出 (题号, 内容)"""
+        return _iter_numbered_buffer(filename, pattern)
+    
+    def _is_correct(self, exercise, answer):
+        """判断一道题的答案是否正确"""
+        try:
+            # 计算题目正确答案
+            correct_result = self._calculate_expression(exercise)
+            
+            # 解析用户答案
+            user_answer = self._parse_answer(answer)
+            
+            # 比较答案
+            return correct_result == user_answer
+                
+        except (ValueError, ZeroDivisionError):
+            # 如果计算过程中出现错误，视为错误答案
+            return False
+    
     def _read_exercises(self, filename):
         """读取题目文件"""
-        exercises = []
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    # 移除题号
-                    match = re.match(r'^\d+\.\s*(.*)\s*=$', line)
-                    if match:
-                        exercises.append(match.group(1))
-        return exercises
+        return _read_numbered_texts(filename, _EXERCISE_BUFFER_PATTERN)
     
     def _read_answers(self, filename):
         """读取答案文件"""
-        answers = []
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    # 移除题号
-                    match = re.match(r'^\d+\.\s*(.*)$', line)
-                    if match:
-                        answers.append(match.group(1))
-        return answers
+        return _read_numbered_texts(filename, _ANSWER_BUFFER_PATTERN)
     
     def _calculate_expression(self, expression):
         """计算表达式结果"""
-        # 将表达式转换为可计算的格式
-        expr = expression.replace('×', '*')
-        expr = expr.replace('÷', '/')
-        
-        # 使用分数计算
-        return self._evaluate_expression(expr)
-    
-    def _evaluate_expression(self, expr):
-        """递归计算表达式"""
-        # 移除空格
-        expr = expr.replace(' ', '')
-        
-        # 处理括号
-        while '(' in expr:
-            start = expr.rfind('(')
-            end = expr.find(')', start)
-            if end == -1:
-                raise ValueError("括号不匹配")
-            
-            inner_result = self._evaluate_expression(expr[start+1:end])
-            expr = expr[:start] + inner_result.to_string() + expr[end+1:]
-        
-        # 处理乘除
-        operators = ['*', '/', '+', '-']
-        
-        for op in operators:
-            if op in expr:
-                parts = expr.split(op, 1)
-                left = self._parse_operand(parts[0])
-                right = self._parse_operand(parts[1])
-                
-                if op == '*':
-                    return left * right
-                elif op == '/':
-                    if right == Fraction(0, 1):
-                        raise ValueError("除数不能为零")
-                    return left / right
-                elif op == '+':
-                    return left + right
-                elif op == '-':
-                    if left < right:
-                        raise ValueError("减法结果不能为负数")
-                    return left - right
-        
-        # 如果没有运算符，直接解析操作数
-        return self._parse_operand(expr)
+        # 单遍解析为表达式树后线性求值
+        return evaluate_expression(expression)
     
     def _parse_operand(self, operand_str):
-        """解析操作数（整数或分数）"""
+        """解析操作数（整数或分数），格式不正确时抛出 ValueError"""
         operand_str = operand_str.strip()
         
-        # 检查是否为分数格式
+        # 检查是否为分数格式；各部分个数不对时解包抛出 ValueError
         if "'" in operand_str:
-            parts = operand_str.split("'")
-            whole = int(parts[0])
-            fraction_parts = parts[1].split('/')
-            numerator = int(fraction_parts[0])
-            denominator = int(fraction_parts[1])
+            whole, fraction_str = operand_str.split("'")
+            numerator, denominator = fraction_str.split('/')
+            whole, numerator, denominator = int(whole), int(numerator), int(denominator)
             return Fraction(whole * denominator + numerator, denominator)
         elif '/' in operand_str:
-            parts = operand_str.split('/')
-            numerator = int(parts[0])
-            denominator = int(parts[1])
-            return Fraction(numerator, denominator)
+            numerator, denominator = operand_str.split('/')
+            return Fraction(int(numerator), int(denominator))
         else:
             return Fraction(int(operand_str), 1)
     
@@ -144,8 +249,207 @@ class Validator:
         """解析用户答案"""
         return self._parse_operand(answer_str)
     
-    def _generate_grade_file(self, correct_indices, wrong_indices):
+    def _generate_grade_file(self, correct_indices, wrong_indices, filename='Grade.txt'):
         """生成成绩统计文件"""
-        with open('Grade.txt', 'w', encoding='utf-8') as f:
-            f.write(f"Correct: {len(correct_indices)} ({', '.join(map(str, correct_indices))})\n")
-            f.write(f"Wrong: {len(wrong_indices)} ({', '.join(map(str, wrong_indices))})\n")
\ No newline at end of file
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(f"Correct: {len(correct_indices)} ({self._format_indices(correct_indices)})\n")
+            f.write(f"Wrong: {len(wrong_indices)} ({self._format_indices(wrong_indices)})\n")
+    
+    def _generate_report_file(self, wrong_counts, submissions, filename):
+        """生成每道题的错误人数与错误率统计"""
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(f"Submissions: {submissions}\n")
+            for number, wrong in wrong_counts.items():
+                rate = wrong / submissions if submissions else 0.0
+                f.write(f"{number}: {wrong}/{submissions} ({rate:.1%})\n")
+    
+    def _format_indices(self, indices):
+        """格式化题号列表"""
+        if isinstance(indices, IndexRanges):
+            return str(indices)
+        return ', '.join(map(str, indices))
+
+
+# 工作进程中的标准答案，由 _set_answer_key 在进程启动时设置
+_answer_key = None
+
+
+def _set_answer_key(answer_key):
+    global _answer_key
+    _answer_key = answer_key
+
+
+def _grade_submission(answer_file):
+    """工作进程入口：按标准答案批改一份答案文件"""
+    return Validator().grade_answers(_answer_key, answer_file)
+
+
+def _expand_answer_files(paths):
+    """展开答案文件列表，目录替换为其中按文件名排序的 .txt 文件"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.endswith('.txt'))
+        else:
+            files.append(path)
+    return files
+
+
+def _grade_file_names(answer_files):
+    """各答案文件对应的成绩文件名
+
+    取答案文件相对于所有答案文件共同目录的路径，去掉扩展名并把路径分隔符换成 '_'，
+    如 subs/alice/Answers.txt 和 subs/bob/Answers.txt 分别对应
+    Grade_alice_Answers.txt 和 Grade_bob_Answers.txt。文件名仍有重复时抛出 ValueError。
+    """
+    if not answer_files:
+        return []
+    paths = [os.path.abspath(answer_file) for answer_file in answer_files]
+    base = os.path.commonpath([os.path.dirname(path) for path in paths])
+    names = []
+    for path in paths:
+        name = os.path.splitext(os.path.relpath(path, base))[0]
+        for separator in filter(None, (os.sep, os.altsep)):
+            name = name.replace(separator, '_')
+        names.append(f'Grade_{name}.txt')
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"多份答案对应同一个成绩文件: {', '.join(duplicates)}")
+    return names
+
+
+@contextlib.contextmanager
+def _map_file(filename, start=0, end=None):
+    """只读映射文件，产出 [start, end) 范围的 memoryview
+
+    start 为 0 时跳过文件开头的 UTF-8 BOM；切片后 '^' 能在范围起点匹配，
+    因此 start 应位于行首。空文件产出空的 bytes。
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if start == 0 and buffer[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+                start = len(codecs.BOM_UTF8)
+            view = memoryview(buffer)[start:end]
+            try:
+                yield view
+            finally:
+                view.release()
+
+
+def _read_numbered_texts(filename, pattern):
+    """一次扫描整个文件，按顺序返回所有带题号行的内容"""
+    with _map_file(filename) as view:
+        # findall 和 map 都在 C 层完成，解释器只参与最后的列表构建
+        return list(map(bytes.decode, map(itemgetter(1), pattern.findall(view))))
+
+
+def _iter_numbered_buffer(filename, pattern, start=0, end=None):
+    """映射文件并用一个预编译的正则扫描 [start, end) 字节范围，产出 (题号, 内容)
+
+    不逐行创建字符串，只解码匹配到的内容。
+    """
+    with _map_file(filename, start, end) as view:
+        matches = pattern.finditer(view)
+        try:
+            for match in matches:
+                yield int(match.group(1)), match.group(2).decode('utf-8')
+        finally:
+            # 匹配对象引用着映射的缓冲区，必须先释放才能关闭映射
+            match = matches = None
+
+
+def _align_to_line(f, pos):
+    """返回 pos 处或之后第一个行首的字节偏移"""
+    if pos == 0:
+        return 0
+    f.seek(pos - 1)
+    f.readline()
+    return f.tell()
+
+
+def _number_at(f, pos, pattern):
+    """返回从 pos 开始的第一个带题号行的题号，文件结束时返回 None
+
+    pattern 与工作进程扫描时相同，保证切分点的题号就是该段实际读到的第一个题号。
+    """
+    f.seek(pos)
+    if pos == 0 and f.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+        f.seek(0)
+    for line in iter(f.readline, b''):
+        match = pattern.match(line)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _find_number_offset(f, size, number, pattern):
+    """二分查找第一个题号不小于 number 的行的字节偏移"""
+    low, high = 0, size
+    while low < high:
+        mid = (low + high) // 2
+        found = _number_at(f, _align_to_line(f, mid), pattern)
+        if found is not None and found < number:
+            low = mid + 1
+        else:
+            high = mid
+    return _align_to_line(f, low)
+
+
+def _split_chunks(exercise_file, answer_file, chunks):
+    """把题目文件和答案文件切成对应的字节段
+
+    返回 [((题目起点, 题目终点), (答案起点, 答案终点)), ...]。
+    """
+    exercise_size = os.path.getsize(exercise_file)
+    answer_size = os.path.getsize(answer_file)
+    
+    # 题目文件按字节均分，边界对齐到行首，并记录每段的第一个题号
+    starts = []
+    with open(exercise_file, 'rb') as f:
+        for k in range(chunks):
+            start = _align_to_line(f, exercise_size * k // chunks)
+            if starts and start <= starts[-1][0]:
+                continue
+            number = _number_at(f, start, _EXERCISE_BUFFER_PATTERN)
+            if number is None:
+                break
+            starts.append((start, number))
+    
+    if not starts:
+        return [((0, exercise_size), (0, answer_size))]
+    
+    # 答案文件在每段第一个题号处切开
+    answer_starts = [0]
+    with open(answer_file, 'rb') as f:
+        for _, number in starts[1:]:
+            answer_starts.append(_find_number_offset(f, answer_size, number,
+                                                     _ANSWER_BUFFER_PATTERN))
+    
+    exercise_bounds = [start for start, _ in starts] + [exercise_size]
+    answer_bounds = answer_starts + [answer_size]
+    return [((exercise_bounds[k], exercise_bounds[k + 1]),
+             (answer_bounds[k], answer_bounds[k + 1]))
+            for k in range(len(starts))]
+
+
+def _grade_chunk(exercise_file, answer_file, chunk):
+    """工作进程入口：验证一段题目，返回 (正确题号列表, 错误题号列表)"""
+    (exercise_start, exercise_end), (answer_start, answer_end) = chunk
+    validator = Validator()
+    exercises = _iter_numbered_buffer(exercise_file, _EXERCISE_BUFFER_PATTERN,
+                                      exercise_start, exercise_end)
+    answers = _iter_numbered_buffer(answer_file, _ANSWER_BUFFER_PATTERN,
+                                    answer_start, answer_end)
+    
+    correct_indices = []
+    wrong_indices = []
+    for number, exercise, answer in validator._iter_pairs(exercises, answers):
+        if answer is not None and validator._is_correct(exercise, answer):
+            correct_indices.append(number)
+        else:
+            wrong_indices.append(number)
+    return correct_indices, wrong_indices
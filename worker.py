@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻工作进程模块
+从标准输入逐行读取 JSON 任务（生成题目、验证答案），向标准输出逐行写出 JSON 结果，
+在任务之间复用已初始化的生成器，省去每次启动解释器和导入模块的开销
+"""
+
+import json
+import random
+import sys
+from expression import ExpressionGenerator
+from validator import Validator
+
+
+class Worker:
+    """处理 JSON 任务
+
+    {"op": "generate", "n": 题目数, "r": 数值范围, "seed": 可选, "constructive": 可选}
+        -> {"exercises": [...], "answers": [...], "attempts": 尝试次数}
+    {"op": "validate", "exercises": [...], "answers": [...]}
+        -> {"correct": [题号...], "wrong": [题号...]}
+
+    任务中的 "id" 原样写回结果；成功时结果带 "ok": true，
+    失败时为 {"ok": false, "error": 错误信息}。
+    """
+
+    def __init__(self):
+        # 按 (数值范围, 是否构造式) 缓存生成器，保留穷举索引等初始化结果
+        self._generators = {}
+        self._validator = Validator()
+
+    def run(self, input_stream=sys.stdin, output_stream=sys.stdout):
+        """逐行处理任务直到输入结束，空行被忽略"""
+        for line in input_stream:
+            if not line.strip():
+                continue
+            output_stream.write(json.dumps(self.handle_line(line), ensure_ascii=False) + '\n')
+            output_stream.flush()
+
+    def handle_line(self, line):
+        try:
+            job = json.loads(line)
+        except ValueError:
+            return {'ok': False, 'error': '任务不是合法的 JSON'}
+        if not isinstance(job, dict):
+            return {'ok': False, 'error': '任务必须是 JSON 对象'}
+
+        result = {'id': job['id']} if 'id' in job else {}
+        try:
+            result.update(self.handle(job))
+            result['ok'] = True
+        except Exception as e:
+            # 任何一个任务出错都只影响该任务，进程继续处理后续任务
+            result.update(ok=False, error=str(e) or type(e).__name__)
+        return result
+
+    def handle(self, job):
+        op = job.get('op')
+        if op == 'generate':
+            return self.generate(job)
+        if op == 'validate':
+            return self.validate(job)
+        raise ValueError(f"未知的任务类型: {op}")
+
+    def generate(self, job):
+        count = _positive_int(job, 'n')
+        max_value = _positive_int(job, 'r')
+        constructive = bool(job.get('constructive', False))
+
+        generator = self._generators.get((max_value, constructive))
+        if generator is None:
+            generator = ExpressionGenerator(max_value=max_value, constructive=constructive)
+            self._generators[max_value, constructive] = generator
+        else:
+            generator.reset()
+
+        capacity = generator.capacity()
+        if capacity is not None and count > capacity:
+            raise ValueError(f"数值范围 {max_value} 内最多只能生成 {capacity} 道不重复的题目")
+        if job.get('seed') is not None:
+            random.seed(job['seed'])
+        exercises, answers = generator.generate_expressions(count)
+        return {'exercises': exercises, 'answers': answers, 'attempts': generator.attempts}
+
+    def validate(self, job):
+        exercises = job.get('exercises')
+        answers = job.get('answers')
+        if not isinstance(exercises, list) or not isinstance(answers, list):
+            raise ValueError("exercises 和 answers 必须是列表")
+        if len(exercises) != len(answers):
+            raise ValueError("exercises 和 answers 的长度必须相同")
+
+        correct_indices = []
+        wrong_indices = []
+        for i, (exercise, answer) in enumerate(zip(exercises, answers), 1):
+            if self._validator._is_correct(str(exercise), str(answer)):
+                correct_indices.append(i)
+            else:
+                wrong_indices.append(i)
+        return {'correct': correct_indices, 'wrong': wrong_indices}
+
+
+def _positive_int(job, name):
+    value = job.get(name)
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise ValueError(f"{name} 必须为正整数")
+    return value